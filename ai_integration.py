@@ -5,23 +5,390 @@ AI模型集成模块
 用于生成修仙小说的具体内容
 """
 
+import asyncio
+import atexit
+import base64
+import copy
+import hashlib
 import json
-import urllib.request
+import http.client
+import re
+import sqlite3
+import threading
 import urllib.parse
-from typing import Dict, List, Any, Optional
+import urllib.request
+from collections import OrderedDict
+from typing import Callable, Dict, List, Any, Iterator, Optional, Tuple
 import time
 
+from config import AIConfig
+
+# 请求体编码器：直接输出UTF-8而不是\uXXXX转义，中文提示词体积约缩小一半
+_PAYLOAD_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+# 模型常把JSON包在```json ... ```代码块里，解析前先去掉
+_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+def _safe_load(text: str) -> Optional[Dict[str, Any]]:
+    """解析模型返回的JSON对象，无法解析时返回None"""
+    text = _FENCE_RE.sub("", text.strip())
+    if not text.startswith("{"):
+        return None
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        return None
+    return data if isinstance(data, dict) else None
+
+# 中文句末标点，用于本地抽取式总结的分句
+_SENTENCE_END_RE = re.compile(r"(?<=[。！？!?])")
+
+def extractive_summary(content: str, limit: int = 100) -> str:
+    """本地抽取式总结：取开头的完整句子，总长不超过limit个字符，无需调用API"""
+    summary = ""
+    for sentence in _SENTENCE_END_RE.split(content):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if len(summary) + len(sentence) > limit:
+            break
+        summary += sentence
+    return summary or content.strip()[:limit]
+
+def _flatten(data: Dict[str, Any], prefix: str = "") -> List[str]:
+    """把嵌套字典展开为单层的"键: 值"行，去掉JSON缩进和括号带来的多余token"""
+    lines = []
+    for key, value in data.items():
+        name = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            lines.extend(_flatten(value, name))
+        elif isinstance(value, (list, tuple)):
+            lines.append(f"{name}: {'、'.join(map(str, value))}")
+        else:
+            lines.append(f"{name}: {value}")
+    return lines
+
+def _sse_delta(line: bytes) -> Optional[str]:
+    """从一行SSE响应中取出增量文本
+    
+    非data行、[DONE]、保活块以及choices为空的块（如Azure的首个块、用量统计块）返回None。
+    """
+    if not line.startswith(b"data:"):
+        return None
+    chunk = line[5:].strip()
+    if not chunk or chunk == b"[DONE]":
+        return None
+    try:
+        event = json.loads(chunk)
+    except json.JSONDecodeError:
+        return None
+    choices = event.get("choices") if isinstance(event, dict) else None
+    if not choices:
+        return None
+    return (choices[0].get("delta") or {}).get("content")
+
+# 批量提示词中区分各章节的 [index i] 标记
+_BATCH_INDEX_RE = re.compile(r"\[index (\d+)\]\s*")
+
+class HTTPConnectionPool:
+    """HTTP长连接池
+
+    按 (scheme, host, port) 缓存空闲连接，后续请求复用已建立的TCP/TLS会话，
+    避免每次调用都重新握手。同时进行的请求数不超过max_connections，
+    多余的请求排队等待，避免并发生成时触发服务端限流。线程安全。
+    
+    与urllib.request.urlopen一样遵循HTTPS_PROXY/HTTP_PROXY/NO_PROXY环境变量：
+    HTTPS请求经代理的CONNECT隧道发送，HTTP请求以完整URL发给代理。
+    """
+    
+    RETRY_STATUS = (429, 500, 502, 503, 504)
+    
+    def __init__(self, max_idle: int = 8, timeout: Optional[float] = None,
+                 max_retries: int = 2, backoff: float = 1.0, max_connections: int = 32):
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._idle: Dict[Tuple[str, str, int], List[http.client.HTTPConnection]] = {}
+        # 各目标地址使用的代理（None表示直连），首次请求该地址时按环境变量确定
+        self._proxies: Dict[Tuple[str, str, int], Optional[urllib.parse.SplitResult]] = {}
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_connections)
+    
+    def _proxy(self, key: Tuple[str, str, int]) -> Optional[urllib.parse.SplitResult]:
+        """目标地址应使用的代理，规则与urllib的ProxyHandler相同"""
+        with self._lock:
+            if key in self._proxies:
+                return self._proxies[key]
+        scheme, host, _ = key
+        proxy = None
+        proxy_url = urllib.request.getproxies().get(scheme)
+        if proxy_url and not urllib.request.proxy_bypass(host):
+            if "://" not in proxy_url:
+                proxy_url = "http://" + proxy_url
+            proxy = urllib.parse.urlsplit(proxy_url)
+        with self._lock:
+            self._proxies[key] = proxy
+        return proxy
+    
+    @staticmethod
+    def _proxy_headers(proxy: urllib.parse.SplitResult) -> Dict[str, str]:
+        """代理URL中带有用户名密码时的认证头"""
+        if not proxy.username:
+            return {}
+        credentials = f"{urllib.parse.unquote(proxy.username)}:{urllib.parse.unquote(proxy.password or '')}"
+        return {"Proxy-Authorization": "Basic " + base64.b64encode(credentials.encode('utf-8')).decode('ascii')}
+    
+    def _acquire(self, key: Tuple[str, str, int]) -> http.client.HTTPConnection:
+        """取出空闲连接，没有则新建"""
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()
+        scheme, host, port = key
+        proxy = self._proxy(key)
+        if proxy is None:
+            if scheme == "https":
+                return http.client.HTTPSConnection(host, port, timeout=self.timeout)
+            return http.client.HTTPConnection(host, port, timeout=self.timeout)
+        
+        proxy_port = proxy.port or 80
+        if scheme == "https":
+            # 先与代理建立TCP连接并发送CONNECT，再在隧道内与目标主机进行TLS握手
+            conn = http.client.HTTPSConnection(proxy.hostname, proxy_port, timeout=self.timeout)
+            conn.set_tunnel(host, port, headers=self._proxy_headers(proxy))
+            return conn
+        return http.client.HTTPConnection(proxy.hostname, proxy_port, timeout=self.timeout)
+    
+    def _release(self, key: Tuple[str, str, int], conn: http.client.HTTPConnection):
+        """归还连接，超出空闲上限则关闭"""
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append(conn)
+                return
+        conn.close()
+    
+    def _finish(self, key: Tuple[str, str, int], conn: http.client.HTTPConnection,
+                response: http.client.HTTPResponse):
+        """响应读取完毕后归还或关闭连接"""
+        if response.will_close:
+            conn.close()
+        else:
+            self._release(key, conn)
+    
+    def _open(self, url: str, body: bytes, headers: Dict[str, str]):
+        """发送POST请求，返回已收到响应头的 (key, 连接, 响应)"""
+        parts = urllib.parse.urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        key = (parts.scheme, parts.hostname, port)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        proxy = self._proxy(key)
+        if proxy is not None and parts.scheme == "http":
+            # 经代理发送的HTTP请求使用完整URL作为请求目标
+            path = url
+            headers = {**headers, **self._proxy_headers(proxy)}
+        
+        attempt = 0
+        while True:
+            conn = self._acquire(key)
+            try:
+                conn.request("POST", path, body=body, headers=headers)
+                response = conn.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionError):
+                # 复用的长连接可能已被服务端关闭，换一条连接重试
+                conn.close()
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                continue
+            except Exception:
+                conn.close()
+                raise
+            
+            if response.status < 400:
+                return key, conn, response
+            
+            payload = response.read()
+            self._finish(key, conn, response)
+            if response.status in self.RETRY_STATUS and attempt < self.max_retries:
+                attempt += 1
+                time.sleep(self.backoff * attempt)
+                continue
+            raise http.client.HTTPException(
+                f"HTTP {response.status}: {payload[:200].decode('utf-8', 'replace')}"
+            )
+    
+    def post(self, url: str, body: bytes, headers: Dict[str, str]) -> bytes:
+        """发送POST请求并返回响应体"""
+        with self._slots:
+            key, conn, response = self._open(url, body, headers)
+            try:
+                payload = response.read()
+            except Exception:
+                conn.close()
+                raise
+            self._finish(key, conn, response)
+        return payload
+    
+    def stream_lines(self, url: str, body: bytes, headers: Dict[str, str]) -> Iterator[bytes]:
+        """发送POST请求并逐行返回响应体（用于SSE流式响应）
+        
+        响应完整读完后连接归还连接池；中途放弃则关闭该连接。
+        """
+        with self._slots:
+            key, conn, response = self._open(url, body, headers)
+            try:
+                for line in response:
+                    yield line
+            except BaseException:
+                conn.close()
+                raise
+            self._finish(key, conn, response)
+    
+    def close_all(self):
+        """关闭所有空闲连接"""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+# 全局共享的连接池，超时时间由AIConfig.REQUEST_TIMEOUT配置
+_HTTP_POOL = HTTPConnectionPool(timeout=AIConfig.REQUEST_TIMEOUT)
+atexit.register(_HTTP_POOL.close_all)
+
+# 系统提示词保持逐字节不变，作为所有请求共同的缓存前缀
+SYSTEM_PROMPT = "你是一个专业的修仙小说作家，擅长创作传统修仙小说。"
+_SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+
+def novel_prompt_cache_key(novel_title: str) -> str:
+    """一部小说的服务端提示词缓存路由键：由系统提示词和小说标题决定，多次运行保持不变"""
+    raw = f"{SYSTEM_PROMPT}\0{novel_title}".encode('utf-8')
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+# 已知模型的上下文窗口（token数），按模型名精确匹配；不在表中的模型不收紧max_tokens
+_CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-4": 8192,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+}
+# 每条消息的角色标记等格式开销
+_MESSAGE_OVERHEAD_TOKENS = 8
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数：ASCII字符约4个一个token，中文等其他字符每字按一个token计"""
+    ascii_chars = len(text.encode('ascii', 'ignore'))
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+# 系统提示词固定不变，token数只需估算一次
+_SYSTEM_PROMPT_TOKENS = estimate_tokens(SYSTEM_PROMPT) + _MESSAGE_OVERHEAD_TOKENS
+
+class PromptCache:
+    """提示词响应缓存
+    
+    以 (模型, 最大token数, 温度, 提示词) 的摘要为键，把API响应持久化到SQLite。
+    相同请求再次出现时直接返回缓存结果，省去一次完整的API往返。
+    缓存读写失败（如多个进程同时运行导致数据库被锁）时只打印提示，不影响生成。
+    """
+    
+    def __init__(self, db_path: str = "prompt_cache.db"):
+        self.db_path = db_path
+        self.init_database()
+    
+    def init_database(self):
+        """初始化缓存表"""
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS prompt_cache (
+                key TEXT PRIMARY KEY,
+                prompt TEXT,
+                response TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.commit()
+        conn.close()
+    
+    @staticmethod
+    def make_key(model_name: str, max_tokens: int, temperature: float, prompt: str) -> str:
+        """计算缓存键"""
+        raw = f"{model_name}\0{max_tokens}\0{temperature}\0{SYSTEM_PROMPT}\0{prompt}".encode('utf-8')
+        return hashlib.blake2b(raw, digest_size=16).hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存，未命中或读取失败时返回None"""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                result = conn.execute("SELECT response FROM prompt_cache WHERE key = ?", (key,)).fetchone()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"提示词缓存读取失败: {e}")
+            return None
+        return result[0] if result else None
+    
+    def set(self, key: str, prompt: str, response: str):
+        """写入缓存，写入失败时放弃缓存，不影响已得到的响应"""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO prompt_cache (key, prompt, response) VALUES (?, ?, ?)",
+                    (key, prompt, response)
+                )
+                conn.commit()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"提示词缓存写入失败: {e}")
+
 class AIGenerator:
     """AI生成器基类"""
     
-    def __init__(self, api_key: str = None, model_name: str = "gpt-3.5-turbo"):
+    def __init__(self, api_key: str = None, model_name: str = "gpt-3.5-turbo",
+                 cache: Optional[PromptCache] = None, prompt_cache_key: Optional[str] = None,
+                 temperature: Optional[float] = None):
         self.api_key = api_key
         self.model_name = model_name
+        # 采样温度，未指定时使用AIConfig.OPENAI_TEMPERATURE
+        self.temperature = AIConfig.OPENAI_TEMPERATURE if temperature is None else temperature
         self.base_url = "https://api.openai.com/v1/chat/completions"
+        self.cache = cache
+        # 服务端提示词缓存的路由键：同一部小说的请求使用相同的键，
+        # 让共享前缀的请求落到同一缓存上
+        self.prompt_cache_key = prompt_cache_key
     
     def generate_text(self, prompt: str, max_tokens: int = 2000) -> str:
         """生成文本"""
         raise NotImplementedError("子类必须实现此方法")
+    
+    def generate_text_stream(self, prompt: str, max_tokens: int = 2000) -> Iterator[str]:
+        """流式生成文本，逐段返回增量内容（默认一次性返回完整结果）"""
+        yield self.generate_text(prompt, max_tokens)
+    
+    async def agenerate_text(self, prompt: str, max_tokens: int = 2000) -> str:
+        """异步生成文本（在线程中执行阻塞的generate_text）"""
+        return await asyncio.to_thread(self.generate_text, prompt, max_tokens)
+    
+    async def agenerate_many(self, prompts: List[str], max_tokens: int = 2000,
+                             concurrency: int = 16) -> List[str]:
+        """并发生成多条相互独立的文本，结果按输入顺序返回
+        
+        concurrency限制同时在途的请求数，避免触发API限流。
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def bounded(prompt: str) -> str:
+            async with semaphore:
+                return await self.agenerate_text(prompt, max_tokens)
+        
+        return await asyncio.gather(*(bounded(prompt) for prompt in prompts))
 
 class OpenAIGenerator(AIGenerator):
     """OpenAI API生成器"""
@@ -31,37 +398,106 @@ class OpenAIGenerator(AIGenerator):
         if not self.api_key:
             return self._mock_generate(prompt)
         
-        headers = {
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(self.model_name, max_tokens, self.temperature, prompt)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        budget = self._fit_max_tokens(prompt, max_tokens)
+        
+        try:
+            # 通过共享连接池发送请求，复用长连接
+            response = _HTTP_POOL.post(self.base_url, self._payload(prompt, budget), self._headers())
+            result = json.loads(response.decode('utf-8'))
+            content = result["choices"][0]["message"]["content"]
+        except TimeoutError as e:
+            # 超时的请求可能仍在正常生成，直接抛出，不用模拟内容冒充生成结果
+            raise TimeoutError(f"API请求超时，可调大AIConfig.REQUEST_TIMEOUT: {e}") from e
+        except Exception as e:
+            print(f"API调用失败: {e}")
+            return self._mock_generate(prompt)
+        
+        if cache_key is not None:
+            self.cache.set(cache_key, prompt, content)
+        return content
+    
+    def generate_text_stream(self, prompt: str, max_tokens: int = 2000) -> Iterator[str]:
+        """使用OpenAI流式接口生成文本，内容随到随返回"""
+        if not self.api_key:
+            yield self._mock_generate(prompt)
+            return
+        
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(self.model_name, max_tokens, self.temperature, prompt)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+        
+        budget = self._fit_max_tokens(prompt, max_tokens)
+        
+        parts = []
+        try:
+            body = self._payload(prompt, budget, stream=True)
+            # 读到响应结束（包括[DONE]之后），使连接可以归还连接池
+            for line in _HTTP_POOL.stream_lines(self.base_url, body, self._headers()):
+                delta = _sse_delta(line)
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        except TimeoutError as e:
+            raise TimeoutError(f"API请求超时，可调大AIConfig.REQUEST_TIMEOUT: {e}") from e
+        except (OSError, http.client.HTTPException) as e:
+            # 只有网络或HTTP层面的错误才回退，已收到的内容保留
+            print(f"API调用失败: {e}")
+            if not parts:
+                yield self._mock_generate(prompt)
+            return
+        
+        if cache_key is not None:
+            self.cache.set(cache_key, prompt, "".join(parts))
+    
+    def _fit_max_tokens(self, prompt: str, max_tokens: int) -> int:
+        """按已知模型的上下文窗口收紧max_tokens
+        
+        未知模型（含带日期的快照版本）原样使用max_tokens。token数只是粗略估算，
+        估算提示词已超长时仍按原max_tokens发送请求，由API判定，不用模拟内容代替。
+        """
+        window = _CONTEXT_WINDOWS.get(self.model_name)
+        if window is None:
+            return max_tokens
+        available = window - _SYSTEM_PROMPT_TOKENS - estimate_tokens(prompt) - _MESSAGE_OVERHEAD_TOKENS
+        if available <= 0:
+            print("提示词可能超出模型上下文长度，仍按原max_tokens发送请求")
+            return max_tokens
+        return min(max_tokens, available)
+    
+    def _headers(self) -> Dict[str, str]:
+        """请求头"""
+        return {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
-        
+    
+    def _payload(self, prompt: str, max_tokens: int, stream: bool = False) -> bytes:
+        """构建请求体"""
         data = {
             "model": self.model_name,
             "messages": [
-                {"role": "system", "content": "你是一个专业的修仙小说作家，擅长创作传统修仙小说。"},
+                _SYSTEM_MESSAGE,
                 {"role": "user", "content": prompt}
             ],
             "max_tokens": max_tokens,
-            "temperature": 0.8
+            "temperature": self.temperature
         }
-        
-        try:
-            # 使用urllib替代requests
-            data_bytes = json.dumps(data).encode('utf-8')
-            req = urllib.request.Request(
-                self.base_url,
-                data=data_bytes,
-                headers=headers,
-                method='POST'
-            )
-            
-            with urllib.request.urlopen(req) as response:
-                result = json.loads(response.read().decode('utf-8'))
-                return result["choices"][0]["message"]["content"]
-        except Exception as e:
-            print(f"API调用失败: {e}")
-            return self._mock_generate(prompt)
+        if stream:
+            data["stream"] = True
+        if self.prompt_cache_key:
+            data["prompt_cache_key"] = self.prompt_cache_key
+        return _PAYLOAD_ENCODER.encode(data).encode('utf-8')
     
     def _mock_generate(self, prompt: str) -> str:
         """模拟生成（当没有API key时使用）"""
@@ -70,37 +506,41 @@ class OpenAIGenerator(AIGenerator):
 class NovelAIGenerator:
     """小说AI生成器"""
     
-    def __init__(self, ai_generator: AIGenerator):
+    def __init__(self, ai_generator: AIGenerator,
+                 summarizer: Optional[Callable[[str], str]] = None):
         self.ai = ai_generator
+        # 可选的本地总结函数（如extractive_summary），设置后章节总结不再调用API
+        self.summarizer = summarizer
     
     def generate_world_setting(self, setting_type: str, requirements: str) -> Dict[str, Any]:
         """生成世界观设定"""
         prompt = f"""
-请为修仙小说生成{setting_type}设定，要求：
-{requirements}
+请为修仙小说生成世界观设定，以JSON格式返回，包含详细的设定内容。
 
-请以JSON格式返回，包含详细的设定内容。
+设定类型：{setting_type}
+要求：
+{requirements}
 """
         
         response = self.ai.generate_text(prompt)
-        try:
-            # 尝试解析JSON
-            return json.loads(response)
-        except:
-            # 如果解析失败，返回结构化数据
-            return {
-                "type": setting_type,
-                "content": response,
-                "generated_at": time.time()
-            }
+        data = _safe_load(response)
+        if data is not None:
+            return data
+        # 如果解析失败，返回结构化数据
+        return {
+            "type": setting_type,
+            "content": response,
+            "generated_at": time.time()
+        }
+    
+    async def agenerate_world_setting(self, setting_type: str, requirements: str) -> Dict[str, Any]:
+        """异步生成世界观设定，可与其他生成任务一起用asyncio.gather并发"""
+        return await asyncio.to_thread(self.generate_world_setting, setting_type, requirements)
     
     def generate_character(self, character_type: str, requirements: str) -> Dict[str, Any]:
         """生成角色设定"""
         prompt = f"""
-请为修仙小说生成{character_type}角色设定，要求：
-{requirements}
-
-请包含以下信息：
+请为修仙小说生成角色设定，包含以下信息：
 - 姓名
 - 性格特点
 - 背景故事
@@ -109,28 +549,54 @@ class NovelAIGenerator:
 - 人际关系
 
 请以JSON格式返回。
+
+角色类型：{character_type}
+要求：
+{requirements}
 """
         
         response = self.ai.generate_text(prompt)
-        try:
-            return json.loads(response)
-        except:
-            return {
-                "type": character_type,
-                "content": response,
-                "generated_at": time.time()
-            }
+        data = _safe_load(response)
+        if data is not None:
+            return data
+        return {
+            "type": character_type,
+            "content": response,
+            "generated_at": time.time()
+        }
+    
+    async def agenerate_character(self, character_type: str, requirements: str) -> Dict[str, Any]:
+        """异步生成角色设定"""
+        return await asyncio.to_thread(self.generate_character, character_type, requirements)
     
     def generate_chapter_outline(self, chapter_number: int, context: str, requirements: str) -> Dict[str, Any]:
         """生成章节大纲"""
-        prompt = f"""
-请为修仙小说第{chapter_number}章生成详细大纲，上下文：
-{context}
-
-要求：
-{requirements}
-
-请包含以下内容：
+        prompt = self._chapter_outline_prompt(chapter_number, context, requirements)
+        response = self.ai.generate_text(prompt)
+        return self._parse_chapter_outline(chapter_number, response)
+    
+    async def agenerate_chapter_outline(self, chapter_number: int, context: str,
+                                        requirements: str) -> Dict[str, Any]:
+        """异步生成章节大纲"""
+        return await asyncio.to_thread(self.generate_chapter_outline, chapter_number, context, requirements)
+    
+    async def agenerate_chapter_outlines(self, chapter_numbers: List[int], contexts: List[str],
+                                         requirements: str) -> List[Dict[str, Any]]:
+        """并发生成多个相互独立的章节大纲"""
+        prompts = [
+            self._chapter_outline_prompt(chapter_number, context, requirements)
+            for chapter_number, context in zip(chapter_numbers, contexts)
+        ]
+        responses = await self.ai.agenerate_many(prompts)
+        return [
+            self._parse_chapter_outline(chapter_number, response)
+            for chapter_number, response in zip(chapter_numbers, responses)
+        ]
+    
+    def _chapter_outline_prompt(self, chapter_number: int, context: str, requirements: str) -> str:
+        """构建章节大纲提示词"""
+        return f"""
+请为修仙小说章节生成详细大纲，包含以下内容：
 - 章节标题
 - 主要事件（列表）
 - 涉及角色
@@ -139,32 +605,51 @@ class NovelAIGenerator:
 - 字数目标：3000字
 
 请以JSON格式返回。
+
+章节：第{chapter_number}章
+上下文：
+{context}
+
+要求：
+{requirements}
 """
-        
-        response = self.ai.generate_text(prompt)
-        try:
-            return json.loads(response)
-        except:
-            return {
-                "chapter_number": chapter_number,
-                "title": f"第{chapter_number}章",
-                "content": response,
-                "generated_at": time.time()
-            }
+    
+    def _parse_chapter_outline(self, chapter_number: int, response: str) -> Dict[str, Any]:
+        """解析章节大纲响应"""
+        data = _safe_load(response)
+        if data is not None:
+            return data
+        return {
+            "chapter_number": chapter_number,
+            "title": f"第{chapter_number}章",
+            "content": response,
+            "generated_at": time.time()
+        }
     
     def generate_chapter_content(self, outline: Dict[str, Any], previous_chapter: Optional[Dict] = None) -> str:
         """生成章节内容"""
+        prompt = self._chapter_content_prompt(outline, previous_chapter)
+        return self.ai.generate_text(prompt, max_tokens=4000)
+    
+    def generate_chapter_content_stream(self, outline: Dict[str, Any],
+                                        previous_chapter: Optional[Dict] = None) -> Iterator[str]:
+        """流式生成章节内容，逐段返回模型输出
+        
+        调用方可以边接收边显示或写入文件，需要完整内容时先收集到列表再"".join()。
+        """
+        prompt = self._chapter_content_prompt(outline, previous_chapter)
+        return self.ai.generate_text_stream(prompt, max_tokens=4000)
+    
+    def _chapter_content_prompt(self, outline: Dict[str, Any], previous_chapter: Optional[Dict]) -> str:
+        """构建章节内容提示词"""
         context = ""
         if previous_chapter:
             context = f"上一章内容：{previous_chapter.get('summary', '')}"
         
-        prompt = f"""
-请根据以下大纲生成修仙小说章节内容：
-
-章节大纲：
-{json.dumps(outline, ensure_ascii=False, indent=2)}
-
-{context}
+        outline_text = "\n".join(_flatten(outline))
+        
+        return f"""
+请根据章节大纲生成修仙小说章节内容。
 
 要求：
 1. 字数控制在3000字左右
@@ -174,34 +659,89 @@ class NovelAIGenerator:
 5. 有适当的悬念和冲突
 
 请直接返回章节内容，不要包含标题。
+
+章节大纲：
+{outline_text}
+
+{context}
 """
-        
-        return self.ai.generate_text(prompt, max_tokens=4000)
+    
+    async def agenerate_chapter_content(self, outline: Dict[str, Any],
+                                        previous_chapter: Optional[Dict] = None) -> str:
+        """异步生成章节内容"""
+        return await asyncio.to_thread(self.generate_chapter_content, outline, previous_chapter)
     
     def generate_chapter_summary(self, content: str) -> str:
         """生成章节总结"""
-        prompt = f"""
-请为以下修仙小说章节生成总结：
+        if self.summarizer is not None:
+            return self.summarizer(content)
+        return self.ai.generate_text(self._chapter_summary_prompt(content), max_tokens=500)
+    
+    async def agenerate_chapter_summaries(self, contents: List[str]) -> List[str]:
+        """并发生成多个已完成章节的总结"""
+        if self.summarizer is not None:
+            return [self.summarizer(content) for content in contents]
+        prompts = [self._chapter_summary_prompt(content) for content in contents]
+        return await self.ai.agenerate_many(prompts, max_tokens=500)
+    
+    def generate_chapter_summaries(self, contents: List[str], batch_size: int = 4) -> List[str]:
+        """批量生成章节总结
+        
+        每batch_size个章节合并为一次请求，用 [index i] 标记区分各章节，
+        把N次API往返减少到N/batch_size次。某章节的总结未能从响应中解析出来时，
+        单独为该章节补发一次请求。
+        """
+        if self.summarizer is not None:
+            return [self.summarizer(content) for content in contents]
+        
+        summaries = []
+        for start in range(0, len(contents), batch_size):
+            batch = contents[start:start + batch_size]
+            response = self.ai.generate_text(
+                self._batched_summary_prompt(batch), max_tokens=500 * len(batch)
+            )
+            parts = _BATCH_INDEX_RE.split(response)
+            parsed = {int(index): text.strip() for index, text in zip(parts[1::2], parts[2::2])}
+            for index, content in enumerate(batch, 1):
+                summary = parsed.get(index)
+                summaries.append(summary if summary else self.generate_chapter_summary(content))
+        return summaries
+    
+    def _batched_summary_prompt(self, contents: List[str]) -> str:
+        """构建批量章节总结提示词"""
+        sections = "\n\n".join(
+            f"[index {index}]\n{content[:1000]}..." for index, content in enumerate(contents, 1)
+        )
+        return f"""
+请为以下多个修仙小说章节分别生成100字左右的总结，每篇总结包含：
+1. 主要情节
+2. 人物发展
+3. 修为进展
+4. 为下章铺垫的内容
 
-章节内容：
-{content[:1000]}...
+每个章节都以编号标记开头，请按章节顺序逐个输出总结，
+每篇总结同样以对应章节的编号标记开头，格式与章节标记完全一致。
 
-请生成100字左右的总结，包含：
+{sections}
+"""
+    
+    def _chapter_summary_prompt(self, content: str) -> str:
+        """构建章节总结提示词"""
+        return f"""
+请为修仙小说章节生成100字左右的总结，包含：
 1. 主要情节
 2. 人物发展
 3. 修为进展
 4. 为下章铺垫的内容
+
+章节内容：
+{content[:1000]}...
 """
-        
-        return self.ai.generate_text(prompt, max_tokens=500)
     
     def generate_next_chapter_plan(self, current_chapter: Dict[str, Any], summary: str) -> str:
         """生成下章计划"""
         prompt = f"""
-基于当前章节的总结：
-{summary}
-
-请为下一章制定详细的写作计划，包含：
+请基于当前章节的总结，为下一章制定详细的写作计划，包含：
 1. 主要情节方向
 2. 需要重点描写的内容
 3. 人物互动安排
@@ -209,18 +749,16 @@ class NovelAIGenerator:
 5. 需要注意的细节
 
 请生成200字左右的详细计划。
+
+当前章节总结：
+{summary}
 """
         
         return self.ai.generate_text(prompt, max_tokens=800)
 
-class CultivationPromptTemplates:
-    """修仙小说提示词模板"""
-    
-    @staticmethod
-    def world_setting_prompt(setting_type: str) -> str:
-        """世界观设定提示词"""
-        templates = {
-            "cultivation_system": """
+# 世界观设定提示词模板
+_WORLD_SETTING_TEMPLATES = {
+    "cultivation_system": """
 请设计一个完整的修仙体系，包含：
 1. 境界划分（从练气到渡劫，每个境界的特点）
 2. 功法分类（心法、功法、秘术等）
@@ -228,7 +766,7 @@ class CultivationPromptTemplates:
 4. 修炼资源（灵石、丹药、法宝等）
 5. 突破条件（每个境界的突破要求）
 """,
-            "geography": """
+    "geography": """
 请设计修仙世界的地理环境，包含：
 1. 主要大陆和区域
 2. 各大宗门分布
@@ -236,7 +774,7 @@ class CultivationPromptTemplates:
 4. 资源分布
 5. 势力格局
 """,
-            "history": """
+    "history": """
 请设计修仙世界的历史背景，包含：
 1. 上古传说
 2. 重大历史事件
@@ -244,14 +782,11 @@ class CultivationPromptTemplates:
 4. 宗门起源
 5. 正邪对立的历史
 """
-        }
-        return templates.get(setting_type, "请设计修仙世界的设定")
-    
-    @staticmethod
-    def character_prompt(character_type: str) -> str:
-        """角色设定提示词"""
-        templates = {
-            "主角": """
+}
+
+# 角色设定提示词模板
+_CHARACTER_TEMPLATES = {
+    "主角": """
 请设计一个修仙小说的主角，包含：
 1. 姓名和基本特征
 2. 性格特点（优缺点）
@@ -260,7 +795,7 @@ class CultivationPromptTemplates:
 5. 成长轨迹规划
 6. 核心价值观
 """,
-            "师父": """
+    "师父": """
 请设计主角的师父角色，包含：
 1. 姓名和身份
 2. 修为境界
@@ -269,7 +804,7 @@ class CultivationPromptTemplates:
 5. 与主角的关系
 6. 背景故事
 """,
-            "反派": """
+    "反派": """
 请设计一个反派角色，包含：
 1. 姓名和身份
 2. 修为境界
@@ -278,17 +813,30 @@ class CultivationPromptTemplates:
 5. 与主角的冲突
 6. 背景故事
 """
-        }
-        return templates.get(character_type, "请设计一个修仙小说角色")
+}
+
+class CultivationPromptTemplates:
+    """修仙小说提示词模板"""
+    
+    @staticmethod
+    def world_setting_prompt(setting_type: str) -> str:
+        """世界观设定提示词"""
+        return _WORLD_SETTING_TEMPLATES.get(setting_type, "请设计修仙世界的设定")
+    
+    @staticmethod
+    def character_prompt(character_type: str) -> str:
+        """角色设定提示词"""
+        return _CHARACTER_TEMPLATES.get(character_type, "请设计一个修仙小说角色")
     
     @staticmethod
     def chapter_outline_prompt(chapter_number: int, context: str) -> str:
-        """章节大纲提示词"""
+        """章节大纲提示词
+        
+        固定的设计要求放在前面，章节号和故事背景放在末尾，
+        使各章节的提示词共享相同前缀，便于命中服务端的提示词缓存。
+        """
         return f"""
-请为修仙小说第{chapter_number}章设计详细大纲。
-
-当前故事背景：
-{context}
+请为修仙小说章节设计详细大纲。
 
 请设计包含以下要素的大纲：
 1. 章节标题（吸引人且符合修仙风格）
@@ -304,18 +852,17 @@ class CultivationPromptTemplates:
 - 包含修炼和战斗元素
 - 人物对话和互动自然
 - 字数控制在3000字左右
+
+章节：第{chapter_number}章
+当前故事背景：
+{context}
 """
     
     @staticmethod
     def chapter_content_prompt(outline: Dict[str, Any]) -> str:
-        """章节内容生成提示词"""
+        """章节内容生成提示词（写作要求在前，大纲数据在后）"""
         return f"""
-请根据以下大纲生成修仙小说章节内容：
-
-章节标题：{outline.get('title', '')}
-主要事件：{outline.get('main_events', [])}
-涉及角色：{outline.get('characters_involved', [])}
-修仙内容：{outline.get('cultivation_content', '')}
+请根据章节大纲生成修仙小说章节内容。
 
 写作要求：
 1. 字数控制在3000字左右
@@ -327,16 +874,55 @@ class CultivationPromptTemplates:
 7. 包含修仙术语和功法描述
 
 请直接返回章节内容，不要包含标题。
+
+章节标题：{outline.get('title', '')}
+主要事件：{outline.get('main_events', [])}
+涉及角色：{outline.get('characters_involved', [])}
+修仙内容：{outline.get('cultivation_content', '')}
 """
 
+# 本地文本统计用的字符类别
+_CJK_RE = re.compile(r"[\u4e00-\u9fff]")
+_PUNCTUATION_RE = re.compile(r"[，。！？、；：“”‘’（）《》…—]")
+
+def text_metrics(content: str) -> Dict[str, Any]:
+    """本地统计章节文本指标，每项都是一次C层面的正则/计数扫描"""
+    length = len(content) or 1
+    cjk_count = _CJK_RE.subn("", content)[1]
+    punctuation_count = _PUNCTUATION_RE.subn("", content)[1]
+    return {
+        "cjk_ratio": round(cjk_count / length, 3),
+        "punctuation_ratio": round(punctuation_count / length, 3),
+        "dialogue_count": content.count("“"),
+        "paragraph_count": sum(1 for line in content.splitlines() if line.strip())
+    }
+
+# 每个QualityChecker在内存中保留的质量报告数
+_QUALITY_REPORT_CACHE_SIZE = 128
+
 class QualityChecker:
     """质量检查器"""
     
     def __init__(self, ai_generator: AIGenerator):
         self.ai = ai_generator
+        # 按章节内容摘要缓存质量报告（LRU），内容未变时重复检查不再调用API；
+        # 跨进程的复用由AI生成器的PromptCache负责，评价提示词只取决于章节内容
+        self._reports: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
     
     def check_chapter_quality(self, content: str) -> Dict[str, Any]:
-        """检查章节质量"""
+        """检查章节质量（返回报告的深拷贝，调用方修改不影响缓存）"""
+        digest = hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest()
+        report = self._reports.get(digest)
+        if report is None:
+            report = self._reports[digest] = self._check_chapter_quality(content)
+            if len(self._reports) > _QUALITY_REPORT_CACHE_SIZE:
+                self._reports.popitem(last=False)
+        else:
+            self._reports.move_to_end(digest)
+        return copy.deepcopy(report)
+    
+    def _check_chapter_quality(self, content: str) -> Dict[str, Any]:
+        """调用AI生成质量报告"""
         prompt = f"""
 请检查以下修仙小说章节的质量：
 
@@ -356,9 +942,14 @@ class QualityChecker:
         return {
             "evaluation": response,
             "word_count": len(content),
+            "metrics": text_metrics(content),
             "check_time": time.time()
         }
     
+    async def acheck_chapter_quality(self, content: str) -> Dict[str, Any]:
+        """异步检查章节质量，多个章节可用asyncio.gather并发检查"""
+        return await asyncio.to_thread(self.check_chapter_quality, content)
+    
     def suggest_improvements(self, content: str, issues: str) -> str:
         """建议改进方案"""
         prompt = f"""
@@ -6,6 +6,7 @@ AI修仙小说生成系统的配置参数
 """
 
 import os
+import functools
 from typing import Dict, Any
 
 class NovelConfig:
@@ -79,6 +80,12 @@ class AIConfig:
     ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY", "")
     GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY", "")
     
+    # API请求的超时时间（秒），None表示不限；非流式生成长章节时首字节前可能等待数分钟
+    REQUEST_TIMEOUT = None
+    
+    # 提示词响应缓存，相同提示词重复运行时直接复用上次的生成结果
+    PROMPT_CACHE_PATH = "prompt_cache.db"
+    
     # 生成参数
     GENERATION_PARAMS = {
         "max_tokens": 4000,
@@ -91,7 +98,10 @@ class AIConfig:
 class DatabaseConfig:
     """数据库配置"""
     
-    DB_PATH = "novel_database.db"
+    # 每部小说独立的数据库，{title}替换为小说标题
+    DB_PATH = "novel_output/{title}/novel_database.db"
+    # 旧版本所有小说共用的数据库，其中的数据不会自动迁移
+    LEGACY_DB_PATH = "novel_database.db"
     BACKUP_INTERVAL = 10  # 每10章备份一次
     
     # 表结构
@@ -235,13 +245,18 @@ CONFIG = {
     "prompt": PromptConfig
 }
 
+@functools.lru_cache(maxsize=None)
+def _config_snapshot(section: str) -> Dict[str, Any]:
+    """读取配置类自身定义的配置项（结果缓存，由update_config失效）"""
+    config_class = CONFIG[section]
+    return {key: value
+            for key, value in vars(config_class).items()
+            if not key.startswith('_') and not callable(value)}
+
 def get_config(section: str) -> Dict[str, Any]:
     """获取配置"""
     if section in CONFIG:
-        config_class = CONFIG[section]
-        return {key: getattr(config_class, key) 
-                for key in dir(config_class) 
-                if not key.startswith('_')}
+        return dict(_config_snapshot(section))
     return {}
 
 def update_config(section: str, key: str, value: Any):
@@ -250,6 +265,7 @@ def update_config(section: str, key: str, value: Any):
         config_class = CONFIG[section]
         if hasattr(config_class, key):
             setattr(config_class, key, value)
+            _config_snapshot.cache_clear()
 
 if __name__ == "__main__":
     # 打印配置信息
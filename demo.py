@@ -5,16 +5,19 @@ AI修仙小说生成系统演示
 完整的使用示例
 """
 
+import asyncio
 import os
 import sys
-import json
+import pickle
+import shutil
 from pathlib import Path
 
 # 添加当前目录到Python路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from novel_generation_system import NovelManager, NovelDatabase, WorldBuilder, CharacterBuilder
-from ai_integration import OpenAIGenerator, NovelAIGenerator, CultivationPromptTemplates, QualityChecker
+from novel_generation_system import NovelManager
+from ai_integration import (OpenAIGenerator, NovelAIGenerator, CultivationPromptTemplates, QualityChecker,
+                            PromptCache, novel_prompt_cache_key)
 from config import get_config, NovelConfig, AIConfig
 
 class NovelGenerationDemo:
@@ -24,14 +27,20 @@ class NovelGenerationDemo:
         self.novel_title = novel_title
         self.config = get_config("novel")
         
-        # 初始化AI生成器
-        self.ai_generator = OpenAIGenerator(api_key=AIConfig.OPENAI_API_KEY)
+        # 初始化AI生成器（有API key时启用提示词缓存，多次演示复用同一批生成结果）；
+        # 同一部小说的请求使用相同的路由键，共享前缀的请求落到服务端的同一缓存上
+        cache = PromptCache(AIConfig.PROMPT_CACHE_PATH) if AIConfig.OPENAI_API_KEY else None
+        self.ai_generator = OpenAIGenerator(api_key=AIConfig.OPENAI_API_KEY, cache=cache,
+                                            prompt_cache_key=novel_prompt_cache_key(novel_title))
         self.novel_ai = NovelAIGenerator(self.ai_generator)
         self.quality_checker = QualityChecker(self.ai_generator)
         
         # 初始化小说管理器
         self.novel_manager = NovelManager(novel_title)
         
+        # 完整演示的阶段检查点目录，演示中途失败时重新运行可从已完成的阶段恢复
+        self.checkpoint_dir = Path(".checkpoints") / novel_title
+        
         print(f"初始化修仙小说生成系统：{novel_title}")
         print("=" * 60)
     
@@ -128,22 +137,22 @@ class NovelGenerationDemo:
         print("\n4. AI集成功能演示")
         print("-" * 30)
         
-        # 使用AI生成世界观设定
-        print("使用AI生成修仙体系...")
+        # 世界观、角色、大纲三项生成互不依赖，并发请求以重叠网络等待
+        print("使用AI并发生成修仙体系、主角设定和章节大纲...")
         prompt = CultivationPromptTemplates.world_setting_prompt("cultivation_system")
-        ai_cultivation = self.novel_ai.generate_world_setting("cultivation_system", prompt)
-        print("✓ AI修仙体系生成完成")
-        
-        # 使用AI生成角色设定
-        print("使用AI生成主角设定...")
         character_prompt = CultivationPromptTemplates.character_prompt("主角")
-        ai_character = self.novel_ai.generate_character("主角", character_prompt)
-        print("✓ AI角色设定生成完成")
-        
-        # 使用AI生成章节大纲
-        print("使用AI生成章节大纲...")
         outline_prompt = CultivationPromptTemplates.chapter_outline_prompt(1, "主角开始修仙")
-        ai_outline = self.novel_ai.generate_chapter_outline(1, "主角开始修仙", outline_prompt)
+        
+        async def generate_all():
+            return await asyncio.gather(
+                self.novel_ai.agenerate_world_setting("cultivation_system", prompt),
+                self.novel_ai.agenerate_character("主角", character_prompt),
+                self.novel_ai.agenerate_chapter_outline(1, "主角开始修仙", outline_prompt),
+            )
+        
+        ai_cultivation, ai_character, ai_outline = asyncio.run(generate_all())
+        print("✓ AI修仙体系生成完成")
+        print("✓ AI角色设定生成完成")
         print("✓ AI章节大纲生成完成")
         
         return {
@@ -180,9 +189,27 @@ class NovelGenerationDemo:
         output_dir = Path(f"novel_output/{self.novel_title}")
         if output_dir.exists():
             print(f"输出目录：{output_dir}")
-            for file in output_dir.glob("*"):
-                if file.is_file():
-                    print(f"  📄 {file.name}")
+            # scandir的目录项自带文件类型信息，无需逐个stat；只列出章节和导出文件，不含数据库文件
+            with os.scandir(output_dir) as entries:
+                lines = [f"  📄 {entry.name}" for entry in entries
+                         if entry.is_file() and entry.name.endswith((".txt", ".json"))]
+            if lines:
+                print("\n".join(lines))
+    
+    def _run_stage(self, stage: str, func, *args):
+        """运行演示阶段，已有检查点时直接加载上次的结果"""
+        checkpoint = self.checkpoint_dir / f"{stage}.pkl"
+        if checkpoint.exists():
+            with open(checkpoint, 'rb') as f:
+                result = pickle.load(f)
+            print(f"\n✓ 从检查点恢复阶段：{stage}")
+            return result
+        
+        result = func(*args)
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        with open(checkpoint, 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return result
     
     def run_full_demo(self):
         """运行完整演示"""
@@ -191,16 +218,16 @@ class NovelGenerationDemo:
         
         try:
             # 1. 世界观构建
-            world_data = self.demo_world_building()
+            world_data = self._run_stage("world_data", self.demo_world_building)
             
             # 2. 角色创建
-            characters = self.demo_character_creation()
+            characters = self._run_stage("characters", self.demo_character_creation)
             
             # 3. AI集成演示
-            ai_results = self.demo_ai_integration()
+            ai_results = self._run_stage("ai_results", self.demo_ai_integration)
             
             # 4. 单章生成演示
-            chapter_data = self.demo_chapter_generation(1)
+            chapter_data = self._run_stage("chapter_data", self.demo_chapter_generation, 1)
             
             # 5. 整卷生成演示（可选，注释掉以节省时间）
             # self.demo_volume_generation(1)
@@ -208,6 +235,9 @@ class NovelGenerationDemo:
             # 6. 数据导出
             self.demo_data_export()
             
+            # 全部阶段完成，清除检查点，下次演示重新生成
+            shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+            
             print("\n" + "=" * 60)
             print("演示完成！")
             print("生成的文件保存在 novel_output 目录中")
@@ -221,6 +251,7 @@ class NovelGenerationDemo:
             
         except Exception as e:
             print(f"演示过程中出现错误：{e}")
+            print(f"已完成阶段的结果保存在 {self.checkpoint_dir}，重新运行将从中断处继续")
             return None
 
 def interactive_demo():
@@ -7,13 +7,30 @@ AI修仙小说生成系统
 
 import json
 import os
-import datetime
-from typing import Dict, List, Any, Optional
-from dataclasses import dataclass, asdict
+import sys
+from typing import Dict, List, Any, Iterator, Optional
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from operator import attrgetter
 import sqlite3
+import threading
+from collections import OrderedDict
 from pathlib import Path
 
-@dataclass
+from config import DatabaseConfig
+
+# 输出文件的写缓冲区大小，整章内容攒满后一次写入，减少系统调用
+_WRITE_BUFFER_SIZE = 1 << 20
+# 串行生成整卷时每个事务提交的章节数：中途失败最多损失一批未提交的章节
+_CHAPTERS_PER_COMMIT = 5
+# 章节文件中正文前后的分隔线
+_SEPARATOR = "=" * 50
+# 数据库存储与导出共用的紧凑JSON编码器：只构造一次，encode()整体走C加速路径，
+# 避免json.dumps带参数调用时每次新建编码器，也比json.dump逐块写入更快
+_JSON_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+@dataclass(slots=True)
 class WorldSetting:
     """世界观设定"""
     cultivation_system: Dict[str, Any]  # 修仙体系
@@ -21,7 +38,7 @@ class WorldSetting:
     history: Dict[str, Any]  # 历史背景
     culture: Dict[str, Any]  # 文化体系
     
-@dataclass
+@dataclass(slots=True)
 class Character:
     """角色设定"""
     name: str
@@ -32,9 +49,9 @@ class Character:
     abilities: List[str]
     relationships: Dict[str, str]
     
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ChapterOutline:
-    """章节大纲"""
+    """章节大纲（生成后不再修改）"""
     chapter_number: int
     title: str
     main_events: List[str]
@@ -42,7 +59,7 @@ class ChapterOutline:
     cultivation_content: str
     word_count_target: int = 3000
     
-@dataclass
+@dataclass(slots=True)
 class Chapter:
     """完整章节"""
     chapter_number: int
@@ -51,9 +68,9 @@ class Chapter:
     word_count: int
     summary: str
     next_chapter_plan: str
-    created_at: str
+    created_at: Optional[str] = None  # 写入数据库时由created_at列的默认值生成
     
-@dataclass
+@dataclass(slots=True)
 class NovelStructure:
     """小说整体结构"""
     title: str
@@ -64,172 +81,432 @@ class NovelStructure:
     world_setting: WorldSetting
     characters: List[Character]
 
+# 按表列顺序一次取出数据类字段的C级取值器，写库时直接得到参数元组
+_CHARACTER_COLUMNS = attrgetter("name", "role", "personality", "background", "cultivation_level")
+_CHAPTER_COLUMNS = attrgetter(
+    "chapter_number", "title", "content", "word_count", "summary", "next_chapter_plan"
+)
+
+# 连接级性能参数，每次打开连接时执行
+_PRAGMA_SCRIPT = """
+PRAGMA journal_mode=WAL;
+PRAGMA synchronous=NORMAL;
+PRAGMA temp_store=MEMORY;
+PRAGMA cache_size=-65536;
+PRAGMA mmap_size=268435456;
+"""
+
+# 数据库表结构及其版本号，表结构变化时递增版本号
+_SCHEMA_VERSION = 1
+_SCHEMA_SCRIPT = """
+-- 世界观表
+CREATE TABLE IF NOT EXISTS world_settings (
+    id INTEGER PRIMARY KEY,
+    setting_type TEXT,
+    content TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 角色表
+CREATE TABLE IF NOT EXISTS characters (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE,
+    role TEXT,
+    personality TEXT,
+    background TEXT,
+    cultivation_level TEXT,
+    abilities TEXT,
+    relationships TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 章节表
+CREATE TABLE IF NOT EXISTS chapters (
+    id INTEGER PRIMARY KEY,
+    chapter_number INTEGER UNIQUE,
+    title TEXT,
+    content TEXT,
+    word_count INTEGER,
+    summary TEXT,
+    next_chapter_plan TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 大纲表
+CREATE TABLE IF NOT EXISTS outlines (
+    id INTEGER PRIMARY KEY,
+    chapter_number INTEGER UNIQUE,
+    title TEXT,
+    main_events TEXT,
+    characters_involved TEXT,
+    cultivation_content TEXT,
+    word_count_target INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+# NovelDatabase使用的SQL语句。集中定义为常量，每条语句只有一份文本，
+# 连接的语句缓存（按SQL文本查找）始终命中同一条预编译语句
+_INSERT_WORLD_SETTING_SQL = "INSERT OR REPLACE INTO world_settings (setting_type, content) VALUES (?, ?)"
+_SELECT_WORLD_SETTING_SQL = "SELECT content FROM world_settings WHERE setting_type = ?"
+_INSERT_CHARACTER_SQL = (
+    "INSERT OR REPLACE INTO characters "
+    "(name, role, personality, background, cultivation_level, abilities, relationships) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+_SELECT_CHARACTER_SQL = "SELECT * FROM characters WHERE name = ?"
+_ITER_CHARACTERS_SQL = "SELECT * FROM characters ORDER BY id"
+_INSERT_CHAPTER_SQL = (
+    "INSERT OR REPLACE INTO chapters "
+    "(chapter_number, title, content, word_count, summary, next_chapter_plan) "
+    "VALUES (?, ?, ?, ?, ?, ?) RETURNING created_at"
+)
+_SELECT_CHAPTER_SQL = "SELECT * FROM chapters WHERE chapter_number = ?"
+_ITER_CHAPTERS_SQL = "SELECT * FROM chapters ORDER BY chapter_number"
+_INSERT_OUTLINE_SQL = (
+    "INSERT OR REPLACE INTO outlines "
+    "(chapter_number, title, main_events, characters_involved, cultivation_content, word_count_target) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+
+# NovelDatabase读缓存的容量：一部小说的活跃角色和世界观设定种类都很少
+_CHARACTER_CACHE_SIZE = 256
+_WORLD_SETTING_CACHE_SIZE = 8
+
+def _lru_get(cache: OrderedDict, key: str):
+    """读取LRU缓存，命中时移到最近使用的一端"""
+    value = cache.get(key)
+    if value is not None:
+        cache.move_to_end(key)
+    return value
+
+def _lru_put(cache: OrderedDict, key: str, value: Any, maxsize: int):
+    """写入LRU缓存，超出容量时淘汰最久未使用的项"""
+    cache[key] = value
+    cache.move_to_end(key)
+    if len(cache) > maxsize:
+        cache.popitem(last=False)
+
+def _intern(value):
+    """驻留字符串值；NULL列读出的None等非字符串值原样返回"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+def _character_from_row(row: tuple) -> Character:
+    """characters表的一行转换为Character
+    
+    角色定位、境界和关系称谓在大量角色间反复出现（"配角"、"练气一层"、"师父"、"待定"等），
+    驻留后所有角色共用同一个字符串对象，节省内存，比较和字典查找也更快。
+    """
+    relationships = json.loads(row[7])
+    if isinstance(relationships, dict):
+        relationships = {sys.intern(key): _intern(value) for key, value in relationships.items()}
+    return Character(
+        name=row[1],
+        role=_intern(row[2]),
+        personality=row[3],
+        background=row[4],
+        cultivation_level=_intern(row[5]),
+        abilities=json.loads(row[6]),
+        relationships=relationships
+    )
+
+def _chapter_from_row(row: tuple) -> Chapter:
+    """chapters表的一行转换为Chapter"""
+    return Chapter(
+        chapter_number=row[1],
+        title=row[2],
+        content=row[3],
+        word_count=row[4],
+        summary=row[5],
+        next_chapter_plan=row[6],
+        created_at=row[7]
+    )
+
+# 各数据类专用的转字典函数，首次转换该类实例时生成
+_RECORD_CONVERTERS: Dict[type, Any] = {}
+
+def _record_converter(cls: type):
+    """为数据类生成转字典函数
+    
+    与dataclass生成__init__的做法相同，按字段拼出函数源码再exec，
+    函数体只是逐个读取属性的字典字面量，没有逐字段的getattr和循环开销。
+    """
+    items = ", ".join(f"{name!r}: record.{name}" for name in cls.__dataclass_fields__)
+    namespace = {}
+    exec(f"def convert(record):\n    return {{{items}}}\n", namespace)
+    return namespace["convert"]
+
+def _record_dict(record) -> Dict[str, Any]:
+    """数据类实例转为字典（浅层，不像asdict那样深拷贝字段值）"""
+    cls = type(record)
+    converter = _RECORD_CONVERTERS.get(cls)
+    if converter is None:
+        converter = _RECORD_CONVERTERS[cls] = _record_converter(cls)
+    return converter(record)
+
+def _write_json_array(f, items):
+    """逐项编码写出JSON数组，不在内存中汇总全部元素"""
+    f.write("[")
+    for index, item in enumerate(items):
+        if index:
+            f.write(",")
+        f.write(_JSON_ENCODER.encode(item))
+    f.write("]")
+
 class NovelDatabase:
     """小说数据库管理"""
     
     def __init__(self, db_path: str = "novel_database.db"):
         self.db_path = db_path
+        # 长期持有一个自动提交模式的连接，批量写入时用transaction()显式合并为一个事务
+        self.conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        # 多线程共享同一连接，所有语句串行执行；可重入，事务期间同一线程内的读写可直接进入
+        self._lock = threading.RLock()
+        # 角色和世界观设定的读缓存（LRU），缓存数据库原始行/JSON文本，保存时失效；只感知本实例的写入
+        self._character_cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._world_setting_cache: "OrderedDict[str, str]" = OrderedDict()
+        self.conn.executescript(_PRAGMA_SCRIPT)
         self.init_database()
     
+    def close(self):
+        """关闭数据库连接"""
+        self.conn.close()
+    
+    def begin(self):
+        """开启事务（多线程共享连接时请改用transaction()，它会在事务期间持有锁）"""
+        self.conn.execute("BEGIN")
+    
+    def commit(self):
+        """提交事务"""
+        self.conn.execute("COMMIT")
+    
+    def rollback(self):
+        """回滚事务
+        
+        事务中读到的未提交数据可能已进入读缓存，回滚后一并清空缓存。
+        """
+        with self._lock:
+            self.conn.execute("ROLLBACK")
+            self._character_cache.clear()
+            self._world_setting_cache.clear()
+    
+    @contextmanager
+    def transaction(self):
+        """事务上下文：块内的所有写入一次提交，出错时整体回滚；已在事务中时直接并入外层事务"""
+        with self._lock:
+            if self.conn.in_transaction:
+                yield
+                return
+            self.begin()
+            try:
+                yield
+            except BaseException:
+                self.rollback()
+                raise
+            self.commit()
+    
     def init_database(self):
-        """初始化数据库"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # 创建世界观表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS world_settings (
-                id INTEGER PRIMARY KEY,
-                setting_type TEXT,
-                content TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # 创建角色表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS characters (
-                id INTEGER PRIMARY KEY,
-                name TEXT UNIQUE,
-                role TEXT,
-                personality TEXT,
-                background TEXT,
-                cultivation_level TEXT,
-                abilities TEXT,
-                relationships TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # 创建章节表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS chapters (
-                id INTEGER PRIMARY KEY,
-                chapter_number INTEGER UNIQUE,
-                title TEXT,
-                content TEXT,
-                word_count INTEGER,
-                summary TEXT,
-                next_chapter_plan TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # 创建大纲表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS outlines (
-                id INTEGER PRIMARY KEY,
-                chapter_number INTEGER UNIQUE,
-                title TEXT,
-                main_events TEXT,
-                characters_involved TEXT,
-                cultivation_content TEXT,
-                word_count_target INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        """初始化数据库：一次executescript创建全部表
         
-        conn.commit()
-        conn.close()
+        建表后在PRAGMA user_version中记录结构版本，已是当前版本的数据库直接跳过建表。
+        """
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= _SCHEMA_VERSION:
+            return
+        self.conn.executescript(_SCHEMA_SCRIPT)
+        self.conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
     
     def save_world_setting(self, setting_type: str, content: Dict):
         """保存世界观设定"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT OR REPLACE INTO world_settings (setting_type, content) VALUES (?, ?)",
-            (setting_type, json.dumps(content, ensure_ascii=False))
-        )
-        conn.commit()
-        conn.close()
+        self.save_world_setting_raw(setting_type, _JSON_ENCODER.encode(content))
+    
+    def save_world_setting_raw(self, setting_type: str, content_json: str):
+        """保存已序列化为JSON的世界观设定，跳过编码"""
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute(_INSERT_WORLD_SETTING_SQL, (setting_type, content_json))
+            self._world_setting_cache.pop(setting_type, None)
     
     def get_world_setting(self, setting_type: str) -> Optional[Dict]:
-        """获取世界观设定"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT content FROM world_settings WHERE setting_type = ?", (setting_type,))
-        result = cursor.fetchone()
-        conn.close()
-        return json.loads(result[0]) if result else None
+        """获取世界观设定（每次返回新解码的字典，命中缓存时省去查询）"""
+        with self._lock:
+            content = _lru_get(self._world_setting_cache, setting_type)
+            if content is None:
+                cursor = self.conn.cursor()
+                cursor.execute(_SELECT_WORLD_SETTING_SQL, (setting_type,))
+                result = cursor.fetchone()
+                if not result:
+                    return None
+                content = result[0]
+                _lru_put(self._world_setting_cache, setting_type, content, _WORLD_SETTING_CACHE_SIZE)
+        return json.loads(content)
     
     def save_character(self, character: Character):
         """保存角色"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT OR REPLACE INTO characters 
-            (name, role, personality, background, cultivation_level, abilities, relationships)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            character.name,
-            character.role,
-            character.personality,
-            character.background,
-            character.cultivation_level,
-            json.dumps(character.abilities, ensure_ascii=False),
-            json.dumps(character.relationships, ensure_ascii=False)
-        ))
-        conn.commit()
-        conn.close()
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute(_INSERT_CHARACTER_SQL, (
+                *_CHARACTER_COLUMNS(character),
+                _JSON_ENCODER.encode(character.abilities),
+                _JSON_ENCODER.encode(character.relationships)
+            ))
+            self._character_cache.pop(character.name, None)
     
     def get_character(self, name: str) -> Optional[Character]:
-        """获取角色"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM characters WHERE name = ?", (name,))
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result:
-            return Character(
-                name=result[1],
-                role=result[2],
-                personality=result[3],
-                background=result[4],
-                cultivation_level=result[5],
-                abilities=json.loads(result[6]),
-                relationships=json.loads(result[7])
-            )
-        return None
+        """获取角色（每次返回新的Character对象，命中缓存时省去查询）"""
+        with self._lock:
+            row = _lru_get(self._character_cache, name)
+            if row is None:
+                cursor = self.conn.cursor()
+                cursor.execute(_SELECT_CHARACTER_SQL, (name,))
+                row = cursor.fetchone()
+                if not row:
+                    return None
+                _lru_put(self._character_cache, name, row, _CHARACTER_CACHE_SIZE)
+        return _character_from_row(row)
     
     def save_chapter(self, chapter: Chapter):
-        """保存章节"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT OR REPLACE INTO chapters 
-            (chapter_number, title, content, word_count, summary, next_chapter_plan)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (
-            chapter.chapter_number,
-            chapter.title,
-            chapter.content,
-            chapter.word_count,
-            chapter.summary,
-            chapter.next_chapter_plan
-        ))
-        conn.commit()
-        conn.close()
+        """保存章节，并把数据库生成的创建时间回填到chapter.created_at"""
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute(_INSERT_CHAPTER_SQL, _CHAPTER_COLUMNS(chapter))
+            chapter.created_at = cursor.fetchone()[0]
+    
+    def save_chapters_bulk(self, chapters: List[Chapter]):
+        """批量保存章节，在同一事务中一次写入"""
+        # executemany不支持RETURNING，逐条执行；语句已预编译缓存，且只在末尾提交一次
+        with self.transaction():
+            for chapter in chapters:
+                self.save_chapter(chapter)
+    
+    def save_outlines_bulk(self, outlines: List[ChapterOutline]):
+        """批量保存章节大纲：一条预编译语句在同一事务中写入全部大纲"""
+        rows = [
+            (
+                outline.chapter_number,
+                outline.title,
+                _JSON_ENCODER.encode(outline.main_events),
+                _JSON_ENCODER.encode(outline.characters_involved),
+                outline.cultivation_content,
+                outline.word_count_target
+            )
+            for outline in outlines
+        ]
+        with self.transaction():
+            self.conn.executemany(_INSERT_OUTLINE_SQL, rows)
     
     def get_chapter(self, chapter_number: int) -> Optional[Chapter]:
         """获取章节"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM chapters WHERE chapter_number = ?", (chapter_number,))
-        result = cursor.fetchone()
-        conn.close()
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute(_SELECT_CHAPTER_SQL, (chapter_number,))
+            result = cursor.fetchone()
         
         if result:
-            return Chapter(
-                chapter_number=result[1],
-                title=result[2],
-                content=result[3],
-                word_count=result[4],
-                summary=result[5],
-                next_chapter_plan=result[6],
-                created_at=result[7]
-            )
+            return _chapter_from_row(result)
         return None
+    
+    def iter_characters(self) -> Iterator[Character]:
+        """按创建顺序遍历全部角色"""
+        return map(_character_from_row, self._iter_rows(_ITER_CHARACTERS_SQL))
+    
+    def iter_chapters(self) -> Iterator[Chapter]:
+        """按章节号顺序遍历全部章节"""
+        return map(_chapter_from_row, self._iter_rows(_ITER_CHAPTERS_SQL))
+    
+    def _iter_rows(self, sql: str, batch_size: int = 64) -> Iterator[tuple]:
+        """分批读取查询结果，内存中只保留一批行；每批在锁内读取，批与批之间释放锁"""
+        with self._lock:
+            cursor = self.conn.execute(sql)
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield from rows
+
+# 内置世界观设定模板，导入时构建一次；各create_*方法从其JSON解码出独立的副本返回，
+# 调用方可以任意修改，不影响模板和其他实例
+
+# 修仙体系
+_CULTIVATION_SYSTEM = {
+    "realms": [
+        {"name": "练气期", "levels": ["练气一层", "练气二层", "练气三层", "练气四层", "练气五层", "练气六层", "练气七层", "练气八层", "练气九层", "练气大圆满"]},
+        {"name": "筑基期", "levels": ["筑基初期", "筑基中期", "筑基后期", "筑基大圆满"]},
+        {"name": "金丹期", "levels": ["金丹初期", "金丹中期", "金丹后期", "金丹大圆满"]},
+        {"name": "元婴期", "levels": ["元婴初期", "元婴中期", "元婴后期", "元婴大圆满"]},
+        {"name": "化神期", "levels": ["化神初期", "化神中期", "化神后期", "化神大圆满"]},
+        {"name": "炼虚期", "levels": ["炼虚初期", "炼虚中期", "炼虚后期", "炼虚大圆满"]},
+        {"name": "合体期", "levels": ["合体初期", "合体中期", "合体后期", "合体大圆满"]},
+        {"name": "大乘期", "levels": ["大乘初期", "大乘中期", "大乘后期", "大乘大圆满"]},
+        {"name": "渡劫期", "levels": ["渡劫初期", "渡劫中期", "渡劫后期", "渡劫大圆满"]}
+    ],
+    "techniques": {
+        "cultivation_methods": ["功法", "心法", "秘术"],
+        "combat_skills": ["剑法", "刀法", "拳法", "掌法", "腿法"],
+        "magical_arts": ["法术", "阵法", "符箓", "丹药", "炼器"]
+    },
+    "resources": ["灵石", "丹药", "法宝", "灵药", "妖兽内丹"]
+}
+
+# 地理环境
+_GEOGRAPHY = {
+    "continents": [
+        {
+            "name": "东域大陆",
+            "description": "修仙文明最为发达的大陆，宗门林立",
+            "major_sects": ["青云门", "蜀山剑派", "昆仑派", "峨眉派"]
+        },
+        {
+            "name": "西域大陆",
+            "description": "神秘莫测的大陆，多秘境险地",
+            "major_sects": ["魔教", "血煞宗", "幽冥谷"]
+        },
+        {
+            "name": "南域大陆",
+            "description": "妖兽横行的大陆，资源丰富",
+            "major_sects": ["万兽宗", "御兽门", "百草谷"]
+        },
+        {
+            "name": "北域大陆",
+            "description": "冰雪覆盖的大陆，多隐世高人",
+            "major_sects": ["冰心谷", "雪山派", "寒月宫"]
+        }
+    ],
+    "secret_realms": [
+        "上古遗迹", "仙人洞府", "秘境空间", "时空裂缝", "混沌之地"
+    ],
+    "dangerous_areas": [
+        "死亡峡谷", "魔渊", "鬼域", "血海", "雷池"
+    ]
+}
+
+# 历史背景
+_HISTORY = {
+    "ancient_legends": [
+        "盘古开天辟地",
+        "女娲造人补天",
+        "三皇五帝治世",
+        "封神大战",
+        "仙魔大战"
+    ],
+    "major_events": [
+        "上古大劫",
+        "仙门分裂",
+        "魔教崛起",
+        "正邪大战",
+        "天地大劫"
+    ],
+    "legendary_figures": [
+        "盘古", "女娲", "伏羲", "神农", "轩辕",
+        "老子", "庄子", "列子", "鬼谷子"
+    ]
+}
+
+# 模板的JSON序列化结果同样只计算一次，保存时直接写入
+_CULTIVATION_SYSTEM_JSON = _JSON_ENCODER.encode(_CULTIVATION_SYSTEM)
+_GEOGRAPHY_JSON = _JSON_ENCODER.encode(_GEOGRAPHY)
+_HISTORY_JSON = _JSON_ENCODER.encode(_HISTORY)
 
 class WorldBuilder:
     """世界观构建器"""
@@ -239,90 +516,20 @@ class WorldBuilder:
     
     def create_cultivation_system(self) -> Dict[str, Any]:
         """创建修仙体系"""
-        cultivation_system = {
-            "realms": [
-                {"name": "练气期", "levels": ["练气一层", "练气二层", "练气三层", "练气四层", "练气五层", "练气六层", "练气七层", "练气八层", "练气九层", "练气大圆满"]},
-                {"name": "筑基期", "levels": ["筑基初期", "筑基中期", "筑基后期", "筑基大圆满"]},
-                {"name": "金丹期", "levels": ["金丹初期", "金丹中期", "金丹后期", "金丹大圆满"]},
-                {"name": "元婴期", "levels": ["元婴初期", "元婴中期", "元婴后期", "元婴大圆满"]},
-                {"name": "化神期", "levels": ["化神初期", "化神中期", "化神后期", "化神大圆满"]},
-                {"name": "炼虚期", "levels": ["炼虚初期", "炼虚中期", "炼虚后期", "炼虚大圆满"]},
-                {"name": "合体期", "levels": ["合体初期", "合体中期", "合体后期", "合体大圆满"]},
-                {"name": "大乘期", "levels": ["大乘初期", "大乘中期", "大乘后期", "大乘大圆满"]},
-                {"name": "渡劫期", "levels": ["渡劫初期", "渡劫中期", "渡劫后期", "渡劫大圆满"]}
-            ],
-            "techniques": {
-                "cultivation_methods": ["功法", "心法", "秘术"],
-                "combat_skills": ["剑法", "刀法", "拳法", "掌法", "腿法"],
-                "magical_arts": ["法术", "阵法", "符箓", "丹药", "炼器"]
-            },
-            "resources": ["灵石", "丹药", "法宝", "灵药", "妖兽内丹"]
-        }
-        
-        self.db.save_world_setting("cultivation_system", cultivation_system)
-        return cultivation_system
+        return self._save_template("cultivation_system", _CULTIVATION_SYSTEM_JSON)
     
     def create_geography(self) -> Dict[str, Any]:
         """创建地理环境"""
-        geography = {
-            "continents": [
-                {
-                    "name": "东域大陆",
-                    "description": "修仙文明最为发达的大陆，宗门林立",
-                    "major_sects": ["青云门", "蜀山剑派", "昆仑派", "峨眉派"]
-                },
-                {
-                    "name": "西域大陆",
-                    "description": "神秘莫测的大陆，多秘境险地",
-                    "major_sects": ["魔教", "血煞宗", "幽冥谷"]
-                },
-                {
-                    "name": "南域大陆",
-                    "description": "妖兽横行的大陆，资源丰富",
-                    "major_sects": ["万兽宗", "御兽门", "百草谷"]
-                },
-                {
-                    "name": "北域大陆",
-                    "description": "冰雪覆盖的大陆，多隐世高人",
-                    "major_sects": ["冰心谷", "雪山派", "寒月宫"]
-                }
-            ],
-            "secret_realms": [
-                "上古遗迹", "仙人洞府", "秘境空间", "时空裂缝", "混沌之地"
-            ],
-            "dangerous_areas": [
-                "死亡峡谷", "魔渊", "鬼域", "血海", "雷池"
-            ]
-        }
-        
-        self.db.save_world_setting("geography", geography)
-        return geography
+        return self._save_template("geography", _GEOGRAPHY_JSON)
     
     def create_history(self) -> Dict[str, Any]:
         """创建历史背景"""
-        history = {
-            "ancient_legends": [
-                "盘古开天辟地",
-                "女娲造人补天",
-                "三皇五帝治世",
-                "封神大战",
-                "仙魔大战"
-            ],
-            "major_events": [
-                "上古大劫",
-                "仙门分裂",
-                "魔教崛起",
-                "正邪大战",
-                "天地大劫"
-            ],
-            "legendary_figures": [
-                "盘古", "女娲", "伏羲", "神农", "轩辕",
-                "老子", "庄子", "列子", "鬼谷子"
-            ]
-        }
-        
-        self.db.save_world_setting("history", history)
-        return history
+        return self._save_template("history", _HISTORY_JSON)
+    
+    def _save_template(self, setting_type: str, content_json: str) -> Dict[str, Any]:
+        """保存模板设定，并返回从同一份JSON解码出的副本，返回值与数据库中的内容始终一致"""
+        self.db.save_world_setting_raw(setting_type, content_json)
+        return json.loads(content_json)
 
 class CharacterBuilder:
     """角色构建器"""
@@ -373,23 +580,14 @@ class OutlineGenerator:
     
     def generate_volume_outline(self, volume_number: int, title: str, main_theme: str) -> List[ChapterOutline]:
         """生成卷大纲"""
-        outlines = []
-        
         # 每卷20章，每章3000字
-        for chapter_num in range(1, 21):
-            chapter_number = (volume_number - 1) * 20 + chapter_num
-            
-            outline = ChapterOutline(
-                chapter_number=chapter_number,
-                title=f"第{chapter_number}章 待定标题",
-                main_events=[],
-                characters_involved=[],
-                cultivation_content="",
-                word_count_target=3000
-            )
-            
-            outlines.append(outline)
+        start_chapter = (volume_number - 1) * 20 + 1
+        outlines = [
+            ChapterOutline(chapter_number, f"第{chapter_number}章 待定标题", [], [], "", 3000)
+            for chapter_number in range(start_chapter, start_chapter + 20)
+        ]
         
+        self.db.save_outlines_bulk(outlines)
         return outlines
     
     def generate_chapter_outline(self, chapter_number: int, context: str) -> ChapterOutline:
@@ -419,37 +617,35 @@ class ChapterGenerator:
     
     def generate_chapter(self, outline: ChapterOutline, previous_chapter: Optional[Chapter] = None) -> Chapter:
         """生成完整章节"""
+        chapter = self.build_chapter(outline, previous_chapter)
+        self.db.save_chapter(chapter)
+        return chapter
+    
+    def build_chapter(self, outline: ChapterOutline, previous_chapter: Optional[Chapter] = None) -> Chapter:
+        """生成章节但不写入数据库"""
         # 这里可以接入AI模型来生成内容
         content = self._generate_content(outline, previous_chapter)
         
-        chapter = Chapter(
+        return Chapter(
             chapter_number=outline.chapter_number,
             title=outline.title,
             content=content,
             word_count=len(content),
             summary=self._generate_summary(content),
-            next_chapter_plan=self._generate_next_plan(outline, content),
-            created_at=datetime.datetime.now().isoformat()
+            next_chapter_plan=self._generate_next_plan(outline, content)
         )
-        
-        self.db.save_chapter(chapter)
-        return chapter
     
     def _generate_content(self, outline: ChapterOutline, previous_chapter: Optional[Chapter]) -> str:
         """生成章节内容"""
         # 这里应该接入AI模型
-        # 暂时返回模板内容
-        content = f"""
-{outline.title}
-
-{outline.cultivation_content}
-
-本章主要讲述了主角的修仙之路。在修炼过程中，主角遇到了各种挑战和机遇，通过不懈努力，最终在修为上有所突破。
-
-{self._generate_detailed_content(outline)}
-        """.strip()
-        
-        return content
+        # 暂时返回模板内容；各段先收集到列表再一次join，接入流式生成后可直接追加片段
+        parts = [
+            outline.title,
+            outline.cultivation_content,
+            "本章主要讲述了主角的修仙之路。在修炼过程中，主角遇到了各种挑战和机遇，通过不懈努力，最终在修为上有所突破。",
+            self._generate_detailed_content(outline),
+        ]
+        return "\n\n".join(parts)
     
     def _generate_detailed_content(self, outline: ChapterOutline) -> str:
         """生成详细内容"""
@@ -464,20 +660,39 @@ class ChapterGenerator:
         """生成下章计划"""
         return "下一章将继续主角的修炼之路，可能会遇到新的挑战和机遇。"
 
+def _build_chapter(outline: ChapterOutline) -> Chapter:
+    """进程池任务：在子进程中独立生成一章，不访问数据库"""
+    return ChapterGenerator(None).build_chapter(outline)
+
 class NovelManager:
     """小说管理器"""
     
     def __init__(self, novel_title: str):
         self.title = novel_title
-        self.db = NovelDatabase()
+        
+        # 创建输出目录
+        self.output_dir = Path(f"novel_output/{novel_title}")
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        
+        # 每部小说使用独立的数据库（DatabaseConfig.DB_PATH），按章节号查找已有章节和导出数据时不会混入其他小说
+        db_path = Path(DatabaseConfig.DB_PATH.format(title=novel_title))
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        if not db_path.exists() and os.path.exists(DatabaseConfig.LEGACY_DB_PATH):
+            print(f"提示：旧版本的小说数据保存在共用的 {DatabaseConfig.LEGACY_DB_PATH} 中，不会自动迁移；"
+                  f"如需继续其中的小说，请将该文件复制为 {db_path}")
+        self.db = NovelDatabase(str(db_path))
         self.world_builder = WorldBuilder(self.db)
         self.character_builder = CharacterBuilder(self.db)
         self.outline_generator = OutlineGenerator(self.db)
         self.chapter_generator = ChapterGenerator(self.db)
+        # 章节文件路径前缀，保存时直接拼接字符串，不必每章构造Path对象
+        self._output_prefix = str(self.output_dir) + os.sep
         
-        # 创建输出目录
-        self.output_dir = Path(f"novel_output/{novel_title}")
-        self.output_dir.mkdir(parents=True, exist_ok=True)
+        # 整卷生成期间的后台写线程及其未完成的写文件任务
+        self._file_writer: Optional[ThreadPoolExecutor] = None
+        self._pending_writes = []
+        # 所在事务尚未提交的章节，提交后才写文件；为None时直接写
+        self._uncommitted_chapters: Optional[List[Chapter]] = None
     
     def initialize_novel(self):
         """初始化小说"""
@@ -509,8 +724,20 @@ class NovelManager:
             "volume_outlines": volume_outlines
         }
     
-    def generate_chapter(self, chapter_number: int):
-        """生成指定章节"""
+    def generate_chapter(self, chapter_number: int, force: bool = False):
+        """生成指定章节
+        
+        数据库中已有该章节时直接返回已有章节（续写中断的小说时不再重复生成），
+        force=True时重新生成。
+        """
+        if not force:
+            existing = self.db.get_chapter(chapter_number)
+            if existing:
+                if not os.path.exists(self._chapter_file_path(existing)):
+                    self._write_chapter_file(existing)
+                print(f"第{chapter_number}章已存在，跳过生成")
+                return existing
+        
         print(f"开始生成第{chapter_number}章...")
         
         # 获取或生成大纲
@@ -523,62 +750,135 @@ class NovelManager:
         chapter = self.chapter_generator.generate_chapter(outline, previous_chapter)
         
         # 保存到文件
-        self._save_chapter_to_file(chapter)
+        self._write_chapter_file(chapter)
         
         print(f"第{chapter_number}章生成完成！")
         return chapter
     
+    def _chapter_file_path(self, chapter: Chapter) -> str:
+        """章节文件路径（章节号用zfill补零，比格式说明符:03d更快）"""
+        return f"{self._output_prefix}第{str(chapter.chapter_number).zfill(3)}章_{chapter.title}.txt"
+    
     def _save_chapter_to_file(self, chapter: Chapter):
         """保存章节到文件"""
-        file_path = self.output_dir / f"第{chapter.chapter_number:03d}章_{chapter.title}.txt"
-        
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(f"标题：{chapter.title}\n")
-            f.write(f"字数：{chapter.word_count}\n")
-            f.write(f"生成时间：{chapter.created_at}\n")
-            f.write("=" * 50 + "\n\n")
-            f.write(chapter.content)
-            f.write("\n\n" + "=" * 50 + "\n")
-            f.write(f"章节总结：{chapter.summary}\n")
-            f.write(f"下章计划：{chapter.next_chapter_plan}\n")
-    
-    def generate_volume(self, volume_number: int):
-        """生成整卷"""
+        file_path = self._chapter_file_path(chapter)
+        
+        # 整个文件先拼成一个字符串，再一次写入
+        text = "".join([
+            f"标题：{chapter.title}\n",
+            f"字数：{chapter.word_count}\n",
+            f"生成时间：{chapter.created_at}\n",
+            _SEPARATOR, "\n\n",
+            chapter.content,
+            "\n\n", _SEPARATOR, "\n",
+            f"章节总结：{chapter.summary}\n",
+            f"下章计划：{chapter.next_chapter_plan}\n",
+        ])
+        with open(file_path, 'w', encoding='utf-8', buffering=_WRITE_BUFFER_SIZE) as f:
+            f.write(text)
+    
+    def _write_chapter_file(self, chapter: Chapter):
+        """写章节文件：后台写线程运行时交给它异步写入，否则同步写入
+        
+        章节所在的事务尚未提交时先暂存，提交后再写，回滚时不会留下没有对应数据的章节文件。
+        """
+        if self._uncommitted_chapters is not None:
+            self._uncommitted_chapters.append(chapter)
+        elif self._file_writer is None:
+            self._save_chapter_to_file(chapter)
+        else:
+            self._pending_writes.append(self._file_writer.submit(self._save_chapter_to_file, chapter))
+    
+    @contextmanager
+    def _background_file_writes(self):
+        """在单独的写线程中保存章节文件，文件IO与下一章的生成重叠进行
+        
+        退出时等待全部文件写完，写入失败的异常在此重新抛出。
+        """
+        self._file_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chapter-writer")
+        try:
+            yield
+        finally:
+            self._file_writer.shutdown(wait=True)
+            self._file_writer = None
+            pending, self._pending_writes = self._pending_writes, []
+            for future in pending:
+                future.result()
+    
+    def generate_volume(self, volume_number: int, max_workers: Optional[int] = None,
+                        force: bool = False):
+        """生成整卷
+        
+        指定max_workers时，各章节内容在进程池中并行生成，再由主进程统一入库和写文件；
+        并行模式下章节之间相互独立，不读取上一章内容。已生成的章节会跳过，force=True时全部重新生成。
+        串行模式每_CHAPTERS_PER_COMMIT章提交一次，中途出错时已提交的章节及其文件保留，
+        未提交那一批既不入库也不写文件，重新运行时从该批继续。
+        """
         print(f"开始生成第{volume_number}卷...")
         
         start_chapter = (volume_number - 1) * 20 + 1
         end_chapter = volume_number * 20
         
-        for chapter_num in range(start_chapter, end_chapter + 1):
-            self.generate_chapter(chapter_num)
+        if max_workers:
+            outlines = [
+                self.outline_generator.generate_chapter_outline(chapter_num, "")
+                for chapter_num in range(start_chapter, end_chapter + 1)
+                if force or self.db.get_chapter(chapter_num) is None
+            ]
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                chapters = list(executor.map(_build_chapter, outlines))
+            self.db.save_chapters_bulk(chapters)
+            for chapter in chapters:
+                self._save_chapter_to_file(chapter)
+            print(f"第{volume_number}卷生成完成！")
+            return
+        
+        # 每_CHAPTERS_PER_COMMIT章合并为一个事务提交，兼顾写入开销与中断后可续写的进度；
+        # 一批章节提交后才把它们的文件交给后台线程写出
+        with self._background_file_writes():
+            for batch_start in range(start_chapter, end_chapter + 1, _CHAPTERS_PER_COMMIT):
+                batch_end = min(batch_start + _CHAPTERS_PER_COMMIT, end_chapter + 1)
+                self._uncommitted_chapters = []
+                try:
+                    with self.db.transaction():
+                        for chapter_num in range(batch_start, batch_end):
+                            self.generate_chapter(chapter_num, force)
+                    committed = self._uncommitted_chapters
+                finally:
+                    self._uncommitted_chapters = None
+                for chapter in committed:
+                    self._write_chapter_file(chapter)
         
         print(f"第{volume_number}卷生成完成！")
     
     def export_novel_data(self):
-        """导出小说数据"""
-        data = {
-            "title": self.title,
-            "world_settings": {},
-            "characters": [],
-            "chapters": []
-        }
+        """导出小说数据
         
+        角色和章节从本部小说的数据库分批读取并逐条写出，导出时内存占用与章节数无关。
+        """
         # 导出世界观设定
+        world_settings = {}
         for setting_type in ["cultivation_system", "geography", "history"]:
             setting = self.db.get_world_setting(setting_type)
             if setting:
-                data["world_settings"][setting_type] = setting
-        
-        # 导出角色信息
-        # 这里需要实现获取所有角色的方法
-        
-        # 导出章节信息
-        # 这里需要实现获取所有章节的方法
+                world_settings[setting_type] = setting
         
         # 保存到JSON文件
         json_path = self.output_dir / "novel_data.json"
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        with open(json_path, 'w', encoding='utf-8', buffering=_WRITE_BUFFER_SIZE) as f:
+            f.write('{"title":')
+            f.write(_JSON_ENCODER.encode(self.title))
+            f.write(',"world_settings":')
+            f.write(_JSON_ENCODER.encode(world_settings))
+            
+            # 导出角色信息
+            f.write(',"characters":')
+            _write_json_array(f, map(_record_dict, self.db.iter_characters()))
+            
+            # 导出章节信息
+            f.write(',"chapters":')
+            _write_json_array(f, map(_record_dict, self.db.iter_chapters()))
+            f.write('}')
         
         print(f"小说数据已导出到：{json_path}")
 
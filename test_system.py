@@ -5,13 +5,77 @@
 验证AI修仙小说生成系统的基本功能
 """
 
+import http.server
+import json
 import os
+import shutil
 import sys
+import threading
+import time
 from pathlib import Path
 
 # 添加当前目录到Python路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+# 本地测试用的API服务
+_STREAM_EVENTS = [
+    'data: {"choices":[]}',  # Azure的首个块不含choices
+    'data:{"choices":[{"delta":{"content":"你好"}}]}',  # data:后没有空格
+    ': keep-alive',
+    'data: {"choices":[{"delta":{"content":"，世界"}}]}',
+    'data: {"choices":[],"usage":{"total_tokens":10}}',  # 用量统计块
+    'data: [DONE]',
+]
+
+class _LocalAPIHandler(http.server.BaseHTTPRequestHandler):
+    """本地测试服务：/flaky首次返回503，/stale响应后直接断开连接，
+    /stream返回SSE流，/chat返回一条对话补全，/slow延迟0.5秒后响应
+    """
+    protocol_version = "HTTP/1.1"
+    clients = set()
+    paths = []
+    failures = {"/flaky": 1}
+    
+    def log_message(self, *args):
+        pass
+    
+    def do_POST(self):
+        _LocalAPIHandler.clients.add(self.client_address)
+        _LocalAPIHandler.paths.append(self.path)
+        self.rfile.read(int(self.headers["Content-Length"]))
+        if self.path == "/slow":
+            time.sleep(0.5)
+        status = 200
+        if _LocalAPIHandler.failures.get(self.path):
+            _LocalAPIHandler.failures[self.path] -= 1
+            status = 503
+        if self.path == "/stream":
+            body = ("\n\n".join(_STREAM_EVENTS) + "\n\n").encode('utf-8')
+        elif self.path == "/chat":
+            body = json.dumps({"choices": [{"message": {"content": "真实回复"}}]}).encode('utf-8')
+        else:
+            body = b"ok" if status == 200 else b"busy"
+        try:
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except ConnectionError:
+            # /slow的客户端已超时断开
+            return
+        if self.path == "/stale":
+            # 不声明Connection: close就断开，模拟服务端回收空闲的长连接
+            self.close_connection = True
+
+def _start_local_api():
+    """在后台线程启动本地测试服务，返回 (服务, 根地址)"""
+    _LocalAPIHandler.clients = set()
+    _LocalAPIHandler.paths = []
+    _LocalAPIHandler.failures = {"/flaky": 1}
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _LocalAPIHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
 def test_basic_functionality():
     """测试基本功能"""
     print("AI修仙小说生成系统 - 基本功能测试")
@@ -114,6 +178,15 @@ def test_world_building():
         print(f"重大事件：{len(history['major_events'])}")
         print(f"传奇人物：{len(history['legendary_figures'])}")
         
+        # 修改返回的设定不影响数据库和之后的构建结果
+        cultivation["resources"].append("仙石")
+        stored = novel_manager.db.get_world_setting("cultivation_system")
+        assert "仙石" not in stored["resources"], "返回的设定与数据库共享数据"
+        rebuilt = novel_manager.world_builder.create_cultivation_system()
+        assert "仙石" not in rebuilt["resources"], "修改返回值改动了内置模板"
+        assert rebuilt == novel_manager.db.get_world_setting("cultivation_system"), "返回的设定与数据库不一致"
+        print("修改返回的设定不影响模板和数据库")
+        
         return True
         
     except Exception as e:
@@ -191,6 +264,406 @@ def test_chapter_generation():
         print(f"章节生成测试失败：{e}")
         return False
 
+def test_multiple_novels():
+    """测试多部小说互不干扰"""
+    print("\n多部小说隔离测试")
+    print("-" * 30)
+    
+    try:
+        from novel_generation_system import NovelManager
+        
+        for title in ("隔离测试甲", "隔离测试乙"):
+            shutil.rmtree(Path("novel_output") / title, ignore_errors=True)
+        
+        # 先后生成两部小说的第1章
+        first = NovelManager("隔离测试甲")
+        first.character_builder.create_main_character("甲书主角")
+        first.generate_chapter(1)
+        
+        second = NovelManager("隔离测试乙")
+        assert second.db.get_chapter(1) is None, "新小说读到了其他小说的章节"
+        chapter = second.generate_chapter(1)
+        assert chapter.created_at is not None, "第1章未写入新小说的数据库"
+        
+        files = list((Path("novel_output") / "隔离测试乙").glob("*.txt"))
+        print(f"第二部小说独立生成第1章，包含 {len(files)} 个章节文件")
+        
+        # 导出数据只包含本部小说的角色和章节
+        second.character_builder.create_main_character("乙书主角")
+        second.export_novel_data()
+        with open(second.output_dir / "novel_data.json", encoding='utf-8') as f:
+            exported = json.load(f)
+        names = [character["name"] for character in exported["characters"]]
+        assert names == ["乙书主角"], f"导出数据混入了其他小说的角色：{names}"
+        assert len(exported["chapters"]) == 1, "导出数据混入了其他小说的章节"
+        print(f"导出数据只包含本部小说：角色 {names}，章节 {len(exported['chapters'])} 个")
+        
+        return True
+        
+    except Exception as e:
+        print(f"多部小说隔离测试失败：{e}")
+        return False
+
+def test_database_rollback():
+    """测试读缓存：事务回滚后不残留未提交的数据，未保存的修改不进入缓存"""
+    print("\n数据库事务回滚测试")
+    print("-" * 30)
+    
+    try:
+        from novel_generation_system import NovelDatabase, Character
+        
+        db_path = Path("novel_output/回滚测试/novel_database.db")
+        shutil.rmtree(db_path.parent, ignore_errors=True)
+        db_path.parent.mkdir(parents=True)
+        
+        db = NovelDatabase(str(db_path))
+        db.save_character(Character("甲", "主角", "", "", "练气一层", [], {}))
+        try:
+            with db.transaction():
+                db.save_character(Character("甲", "反派", "", "", "练气一层", [], {}))
+                db.get_character("甲")  # 事务内读取，未提交的数据进入缓存
+                raise RuntimeError("模拟写入失败")
+        except RuntimeError:
+            pass
+        
+        role = db.get_character("甲").role
+        assert role == "主角", f"回滚后读到了未提交的角色数据：{role}"
+        print(f"回滚后角色定位：{role}")
+        
+        # 未保存的修改不影响之后读取的结果
+        character = db.get_character("甲")
+        character.cultivation_level = "筑基初期"
+        level = db.get_character("甲").cultivation_level
+        assert level == "练气一层", f"未保存的修改进入了缓存：{level}"
+        print(f"未保存修改时再次读取的境界：{level}")
+        db.close()
+        
+        return True
+        
+    except Exception as e:
+        print(f"数据库事务回滚测试失败：{e}")
+        return False
+
+def test_character_null_fields():
+    """测试角色的定位、境界、关系为空时的读写"""
+    print("\n角色空字段测试")
+    print("-" * 30)
+    
+    try:
+        from novel_generation_system import NovelDatabase, Character
+        
+        db_path = Path("novel_output/空字段测试/novel_database.db")
+        shutil.rmtree(db_path.parent, ignore_errors=True)
+        db_path.parent.mkdir(parents=True)
+        
+        db = NovelDatabase(str(db_path))
+        db.save_character(Character("乙", None, "", "", None, [], None))
+        character = db.get_character("乙")
+        assert character.role is None and character.cultivation_level is None, "空字段读回后不为None"
+        print(f"✓ 空字段角色读取成功：{character.name}")
+        db.close()
+        
+        return True
+        
+    except Exception as e:
+        print(f"角色空字段测试失败：{e}")
+        return False
+
+def test_http_connection_pool():
+    """测试HTTP长连接池：连接复用、失败重试、失效连接重连和代理"""
+    print("\nHTTP连接池测试")
+    print("-" * 30)
+    
+    try:
+        from unittest import mock
+        from ai_integration import HTTPConnectionPool
+        
+        server, base = _start_local_api()
+        pool = HTTPConnectionPool(backoff=0)
+        
+        # 连续请求复用同一条连接
+        for _ in range(3):
+            assert pool.post(base + "/ok", b"{}", {}) == b"ok"
+        assert len(_LocalAPIHandler.clients) == 1, f"连接未复用：{len(_LocalAPIHandler.clients)} 条连接"
+        print("✓ 3次请求复用1条连接")
+        
+        # 503自动重试
+        assert pool.post(base + "/flaky", b"{}", {}) == b"ok"
+        print("✓ 503响应重试后成功")
+        
+        # 服务端已关闭的空闲连接被丢弃，换新连接重发
+        pool.post(base + "/stale", b"{}", {})
+        assert pool.post(base + "/ok", b"{}", {}) == b"ok"
+        assert len(_LocalAPIHandler.clients) == 2, "失效连接未重建"
+        print("✓ 失效连接自动重连")
+        pool.close_all()
+        
+        # HTTP_PROXY生效时，请求以完整URL发给代理
+        proxy_env = {"http_proxy": base, "HTTP_PROXY": base, "no_proxy": "", "NO_PROXY": ""}
+        with mock.patch.dict(os.environ, proxy_env):
+            proxy_pool = HTTPConnectionPool(backoff=0)
+            assert proxy_pool.post("http://example.invalid/proxied", b"{}", {}) == b"ok"
+            proxy_pool.close_all()
+        assert _LocalAPIHandler.paths[-1] == "http://example.invalid/proxied", "请求未经过代理"
+        print("✓ 请求经HTTP_PROXY代理发送")
+        
+        # 请求超时直接抛出，不以模拟内容代替
+        from ai_integration import OpenAIGenerator
+        generator = OpenAIGenerator(api_key="test-key")
+        generator.base_url = base + "/slow"
+        with mock.patch("ai_integration._HTTP_POOL", HTTPConnectionPool(timeout=0.1)):
+            try:
+                generator.generate_text("提示词")
+            except TimeoutError:
+                print("✓ 请求超时时抛出TimeoutError")
+            else:
+                raise AssertionError("请求超时后返回了模拟内容")
+        
+        server.shutdown()
+        server.server_close()
+        return True
+        
+    except Exception as e:
+        print(f"HTTP连接池测试失败：{e}")
+        return False
+
+def test_streaming_response():
+    """测试流式响应解析：跳过空choices块、保活行，兼容data:后无空格"""
+    print("\n流式响应测试")
+    print("-" * 30)
+    
+    try:
+        from ai_integration import OpenAIGenerator
+        
+        server, base = _start_local_api()
+        generator = OpenAIGenerator(api_key="test-key")
+        generator.base_url = base + "/stream"
+        text = "".join(generator.generate_text_stream("测试提示词"))
+        assert text == "你好，世界", f"流式内容不完整：{text}"
+        print(f"✓ 流式内容完整：{text}")
+        
+        server.shutdown()
+        server.server_close()
+        return True
+        
+    except Exception as e:
+        print(f"流式响应测试失败：{e}")
+        return False
+
+def test_prompt_cache_failure():
+    """测试提示词缓存不可用时仍返回API响应，缓存键区分温度"""
+    print("\n提示词缓存容错测试")
+    print("-" * 30)
+    
+    try:
+        from ai_integration import OpenAIGenerator, PromptCache
+        
+        cache_dir = Path("novel_output/缓存测试")
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        cache_dir.mkdir(parents=True)
+        cache = PromptCache(str(cache_dir / "prompt_cache.db"))
+        
+        key = cache.make_key("gpt-3.5-turbo", 100, 0.8, "提示词")
+        assert key != cache.make_key("gpt-3.5-turbo", 100, 0.2, "提示词"), "缓存键未区分温度"
+        print("✓ 不同温度使用不同的缓存键")
+        
+        # 同一部小说的服务端缓存路由键稳定，并随请求发送
+        from ai_integration import novel_prompt_cache_key
+        routing_key = novel_prompt_cache_key("修仙之路")
+        assert routing_key == novel_prompt_cache_key("修仙之路") != novel_prompt_cache_key("别的小说")
+        payload = json.loads(OpenAIGenerator(prompt_cache_key=routing_key)._payload("提示词", 100))
+        assert payload["prompt_cache_key"] == routing_key, "请求未携带提示词缓存路由键"
+        print("✓ 请求携带本部小说的提示词缓存路由键")
+        
+        # 缓存路径指向目录，读写都会抛出sqlite3.Error
+        cache.db_path = str(cache_dir)
+        server, base = _start_local_api()
+        generator = OpenAIGenerator(api_key="test-key", cache=cache)
+        generator.base_url = base + "/chat"
+        text = generator.generate_text("提示词")
+        assert text == "真实回复", f"缓存出错时丢弃了API响应：{text}"
+        print(f"✓ 缓存不可用时仍返回API响应：{text}")
+        
+        server.shutdown()
+        server.server_close()
+        return True
+        
+    except Exception as e:
+        print(f"提示词缓存容错测试失败：{e}")
+        return False
+
+def test_quality_report_cache():
+    """测试质量报告缓存：返回副本，容量有上限"""
+    print("\n质量报告缓存测试")
+    print("-" * 30)
+    
+    try:
+        from ai_integration import OpenAIGenerator, QualityChecker
+        
+        checker = QualityChecker(OpenAIGenerator())
+        report = checker.check_chapter_quality("林逸盘膝而坐，运转功法。")
+        report["metrics"]["cjk_ratio"] = -1
+        cached = checker.check_chapter_quality("林逸盘膝而坐，运转功法。")
+        assert cached["metrics"]["cjk_ratio"] != -1, "修改返回的报告影响了缓存"
+        print("✓ 修改返回的报告不影响缓存")
+        
+        for index in range(200):
+            checker.check_chapter_quality(f"第{index}章")
+        assert len(checker._reports) <= 128, f"缓存未限制容量：{len(checker._reports)}"
+        print(f"✓ 缓存保留 {len(checker._reports)} 份报告")
+        
+        return True
+        
+    except Exception as e:
+        print(f"质量报告缓存测试失败：{e}")
+        return False
+
+def test_schema_version():
+    """测试已有数据库（结构版本为0）打开后升级版本号且原有数据可读"""
+    print("\n数据库结构版本测试")
+    print("-" * 30)
+    
+    try:
+        import sqlite3
+        from novel_generation_system import NovelDatabase, _SCHEMA_VERSION
+        
+        db_path = Path("novel_output/版本测试/novel_database.db")
+        shutil.rmtree(db_path.parent, ignore_errors=True)
+        db_path.parent.mkdir(parents=True)
+        
+        # 模拟引入版本号之前创建的数据库：表已存在，user_version为0
+        conn = sqlite3.connect(db_path)
+        conn.execute("""
+            CREATE TABLE chapters (
+                id INTEGER PRIMARY KEY,
+                chapter_number INTEGER UNIQUE,
+                title TEXT,
+                content TEXT,
+                word_count INTEGER,
+                summary TEXT,
+                next_chapter_plan TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        conn.execute("INSERT INTO chapters (chapter_number, title, content, word_count, summary, next_chapter_plan) "
+                     "VALUES (1, '旧章节', '旧内容', 3, '', '')")
+        conn.commit()
+        conn.close()
+        
+        db = NovelDatabase(str(db_path))
+        version = db.conn.execute("PRAGMA user_version").fetchone()[0]
+        assert version == _SCHEMA_VERSION, f"结构版本未更新：{version}"
+        assert db.get_chapter(1).title == "旧章节", "升级后原有章节不可读"
+        tables = {row[0] for row in db.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        assert {"world_settings", "characters", "chapters", "outlines"} <= tables, f"缺少数据表：{tables}"
+        db.close()
+        
+        # 再次打开已是当前版本的数据库，跳过建表
+        db = NovelDatabase(str(db_path))
+        assert db.get_chapter(1).title == "旧章节"
+        db.close()
+        print(f"✓ 已有数据库升级到结构版本 {version}，原有章节保留")
+        
+        return True
+        
+    except Exception as e:
+        print(f"数据库结构版本测试失败：{e}")
+        return False
+
+def test_batched_summaries():
+    """测试批量章节总结：按[index i]标记拆分，缺失的章节单独补发请求"""
+    print("\n批量章节总结测试")
+    print("-" * 30)
+    
+    try:
+        from ai_integration import AIGenerator, NovelAIGenerator
+        
+        class BatchGenerator(AIGenerator):
+            """批量请求只返回第1、3章的总结，单章请求返回固定总结"""
+            
+            def __init__(self):
+                super().__init__()
+                self.prompts = []
+            
+            def generate_text(self, prompt: str, max_tokens: int = 2000) -> str:
+                self.prompts.append(prompt)
+                if "[index 1]" in prompt:
+                    return "[index 1] 第一章总结\n[index 3]\n第三章总结"
+                return "单独总结"
+        
+        generator = BatchGenerator()
+        novel_ai = NovelAIGenerator(generator)
+        summaries = novel_ai.generate_chapter_summaries(["第一章", "第二章", "第三章"], batch_size=3)
+        assert summaries == ["第一章总结", "单独总结", "第三章总结"], f"总结解析错误：{summaries}"
+        assert len(generator.prompts) == 2, f"请求次数不符：{len(generator.prompts)}"
+        print(f"✓ 3章总结用 {len(generator.prompts)} 次请求完成：{summaries}")
+        
+        return True
+        
+    except Exception as e:
+        print(f"批量章节总结测试失败：{e}")
+        return False
+
+def test_volume_generation():
+    """测试整卷生成：串行路径和进程池并行路径"""
+    print("\n整卷生成测试")
+    print("-" * 30)
+    
+    try:
+        from novel_generation_system import NovelManager
+        
+        shutil.rmtree(Path("novel_output") / "整卷测试", ignore_errors=True)
+        novel_manager = NovelManager("整卷测试")
+        
+        # 串行生成第1卷，章节文件由后台线程写出
+        novel_manager.generate_volume(1)
+        files = list(novel_manager.output_dir.glob("*.txt"))
+        assert len(files) == 20, f"串行生成的章节文件数不符：{len(files)}"
+        
+        # 进程池并行生成第2卷
+        novel_manager.generate_volume(2, max_workers=2)
+        files = list(novel_manager.output_dir.glob("*.txt"))
+        assert len(files) == 40, f"并行生成的章节文件数不符：{len(files)}"
+        chapters = list(novel_manager.db.iter_chapters())
+        assert [chapter.chapter_number for chapter in chapters] == list(range(1, 41)), "章节未全部入库"
+        assert all(chapter.created_at for chapter in chapters), "章节缺少创建时间"
+        
+        # 已生成的章节再次生成时跳过
+        novel_manager.generate_volume(1)
+        assert len(list(novel_manager.db.iter_chapters())) == 40
+        print(f"✓ 两卷共 {len(chapters)} 章入库，{len(files)} 个章节文件")
+        
+        # 第8章生成失败：已提交的前5章保留文件，未提交的第6、7章既不入库也不留文件
+        shutil.rmtree(Path("novel_output") / "续写测试", ignore_errors=True)
+        novel_manager = NovelManager("续写测试")
+        build_chapter = novel_manager.chapter_generator.build_chapter
+        
+        def failing_build(outline, previous_chapter=None):
+            if outline.chapter_number == 8:
+                raise RuntimeError("模拟生成失败")
+            return build_chapter(outline, previous_chapter)
+        
+        novel_manager.chapter_generator.build_chapter = failing_build
+        try:
+            novel_manager.generate_volume(1)
+        except RuntimeError:
+            pass
+        stored = [chapter.chapter_number for chapter in novel_manager.db.iter_chapters()]
+        files = list(novel_manager.output_dir.glob("*.txt"))
+        assert stored == [1, 2, 3, 4, 5], f"失败后入库的章节不符：{stored}"
+        assert len(files) == 5, f"失败后留下的章节文件数不符：{len(files)}"
+        
+        novel_manager.chapter_generator.build_chapter = build_chapter
+        novel_manager.generate_volume(1)
+        assert len(list(novel_manager.output_dir.glob("*.txt"))) == 20
+        print(f"✓ 第8章失败时保留已提交的 {len(stored)} 章，重新运行后补齐整卷")
+        
+        return True
+        
+    except Exception as e:
+        print(f"整卷生成测试失败：{e}")
+        return False
+
 def main():
     """主函数"""
     print("开始AI修仙小说生成系统测试")
@@ -205,6 +678,16 @@ def main():
     test_world_building()
     test_character_creation()
     test_chapter_generation()
+    test_multiple_novels()
+    test_database_rollback()
+    test_character_null_fields()
+    test_http_connection_pool()
+    test_streaming_response()
+    test_prompt_cache_failure()
+    test_quality_report_cache()
+    test_schema_version()
+    test_batched_summaries()
+    test_volume_generation()
     
     print("\n" + "=" * 60)
     print("所有测试完成！")